@@ -0,0 +1,190 @@
+"""
+Knuth's Algorithm X on a Dancing Links matrix, for exact cover problems
+"""
+
+
+class DancingLinks:
+    """
+    A sparse 0/1 matrix for an exact cover problem: choose a set of rows
+    that together have exactly one 1 in every column.
+
+    Nodes are numbered, and their links are kept in parallel lists
+    rather than in node objects.  Node 0 is the root, nodes 1 to
+    num_columns are the column headers, and the 1s of the rows follow.
+
+    === Attributes ===
+    @type num_columns: int
+        number of columns of the matrix
+    @type num_rows: int
+        number of rows added so far
+    """
+
+    def __init__(self, num_columns):
+        """
+        Create a new DancingLinks self with num_columns columns and no rows.
+
+        @type self: DancingLinks
+        @type num_columns: int
+        @rtype: None
+        """
+        self.num_columns, self.num_rows = num_columns, 0
+        nodes = num_columns + 1
+        # left, right, up and down neighbours of each node
+        self._left = [i - 1 for i in range(nodes)]
+        self._left[0] = num_columns
+        self._right = [i + 1 for i in range(nodes)]
+        self._right[num_columns] = 0
+        self._up = list(range(nodes))
+        self._down = list(range(nodes))
+        # column header of each node, and row of each non-header node
+        self._column = list(range(nodes))
+        self._row = [-1] * nodes
+        # number of nodes in each column
+        self._size = [0] * nodes
+
+    def add_row(self, columns):
+        """
+        Add a row with 1s in columns, numbered from 0, to DancingLinks self
+        and return its number.
+
+        @type self: DancingLinks
+        @type columns: list[int]
+        @rtype: int
+
+        >>> dl = DancingLinks(3)
+        >>> dl.add_row([0, 2]), dl.add_row([1])
+        (0, 1)
+        """
+        row = self.num_rows
+        self.num_rows += 1
+        first = len(self._column)
+        for i in range(len(columns)):
+            header = columns[i] + 1
+            node = first + i
+            self._column.append(header)
+            self._row.append(row)
+            # link at the bottom of the column
+            self._up.append(self._up[header])
+            self._down.append(header)
+            self._down[self._up[header]] = node
+            self._up[header] = node
+            self._size[header] += 1
+            # link into the circular list of the row
+            self._left.append(first + i - 1 if i > 0
+                              else first + len(columns) - 1)
+            self._right.append(first + i + 1 if i < len(columns) - 1
+                               else first)
+        return row
+
+    def _cover(self, c):
+        # Remove column header c and every row with a 1 in column c.
+        left, right, up, down = self._left, self._right, self._up, self._down
+        column, size = self._column, self._size
+        right[left[c]], left[right[c]] = right[c], left[c]
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]], up[down[j]] = down[j], up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    def _uncover(self, c):
+        # Undo _cover(c); covers must be undone in reverse order.
+        left, right, up, down = self._left, self._right, self._up, self._down
+        column, size = self._column, self._size
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = left[right[c]] = c
+
+    def _select(self, r):
+        # Cover the columns of node r's row other than r's own.
+        j = self._right[r]
+        while j != r:
+            self._cover(self._column[j])
+            j = self._right[j]
+
+    def _unselect(self, r):
+        # Undo _select(r).
+        j = self._left[r]
+        while j != r:
+            self._uncover(self._column[j])
+            j = self._left[j]
+
+    def solutions(self, stop=None):
+        """
+        Yield each exact cover of DancingLinks self as a sorted list of
+        row numbers.  If stop is given, it is called every 256 columns
+        covered, and the search ends early once it returns True.
+
+        The search always branches on a column with the fewest 1s left,
+        and keeps its own stack rather than recursing, so large matrices
+        cannot exceed the recursion limit.  The matrix is restored when
+        the generator finishes or is closed.
+
+        @type self: DancingLinks
+        @type stop: (() -> bool) | None
+        @rtype: Iterator[list[int]]
+
+        >>> dl = DancingLinks(4)
+        >>> for columns in [[0, 1], [2, 3], [0], [1, 2], [3]]:
+        ...     _ = dl.add_row(columns)
+        >>> sorted(dl.solutions())
+        [[0, 1], [2, 3, 4]]
+        >>> list(dl.solutions(lambda: True))
+        []
+        """
+        right, down, size = self._right, self._down, self._size
+        # chosen row node and covered column at each level of the search
+        chosen, covered = [], []
+        covers = 0
+        try:
+            forward = True
+            while True:
+                if forward:
+                    if right[0] == 0:
+                        yield sorted([self._row[r] for r in chosen])
+                        forward = False
+                        continue
+                    # column with the fewest 1s left; one with at most
+                    # one can't be beaten, so stop looking there
+                    c, j = right[0], right[right[0]]
+                    while j != 0 and size[c] > 1:
+                        if size[j] < size[c]:
+                            c = j
+                        j = right[j]
+                    if size[c] == 0:
+                        forward = False
+                        continue
+                    if stop is not None and covers % 256 == 0 and stop():
+                        return
+                    covers += 1
+                    self._cover(c)
+                    covered.append(c)
+                    chosen.append(down[c])
+                    self._select(down[c])
+                else:
+                    if not covered:
+                        return
+                    c, r = covered[-1], chosen[-1]
+                    self._unselect(r)
+                    r = down[r]
+                    if r == c:
+                        self._uncover(c)
+                        covered.pop()
+                        chosen.pop()
+                    else:
+                        chosen[-1] = r
+                        self._select(r)
+                        forward = True
+        finally:
+            while covered:
+                self._unselect(chosen.pop())
+                self._uncover(covered.pop())
@@ -58,6 +58,26 @@ class GridPegSolitairePuzzle(Puzzle):
                self._marker == other._marker and
                self._marker_set == other._marker_set)
 
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return a hashable key identifying the configuration of
+        GridPegSolitairePuzzle self.
+
+        @type self: GridPegSolitairePuzzle
+        @rtype: tuple
+        >>> grid = [['*', '*', '*'], ['*', '*', '*'], ['*', '*', '.']]
+        >>> d1 = GridPegSolitairePuzzle(grid, {'#', '.', '*'})
+        >>> d2 = GridPegSolitairePuzzle([row[:] for row in grid], {'#', '.', '*'})
+        >>> d1.state_key() == d2.state_key()
+        True
+        >>> len({d1, d2})
+        1
+        """
+        return (tuple([tuple(row) for row in self._marker]),
+                frozenset(self._marker_set))
+
     def __str__(self):
         """
         Return a human-readable string representation of
@@ -108,48 +128,110 @@ class GridPegSolitairePuzzle(Puzzle):
         >>> len(L1) == len(L2)
         True
         """
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the extensions of GridPegSolitairePuzzle self one at a time,
+        building each only when it is asked for.
+
+        @type self: GridPegSolitairePuzzle
+        @rtype: Iterator[GridPegSolitairePuzzle]
+
+        >>> grid = [['*', '*', '*'], ['*', '*', '*'], ['*', '*', '.']]
+        >>> d = GridPegSolitairePuzzle(grid, {'#', '.', '*'})
+        >>> print(next(d.iter_extensions()))
+        ***
+        ***
+        ..*
+        """
+        for _, extension in self.iter_moves():
+            yield extension
+
+    def iter_moves(self, skip=None):
+        """
+        Yield (move, extension) for each extension of
+        GridPegSolitairePuzzle self, where move is (row, column,
+        direction): the peg at row and column jumps in direction "L",
+        "R", "U" or "D".  Move skip is left out.
+
+        @type self: GridPegSolitairePuzzle
+        @type skip: (int, int, str) | None
+        @rtype: Iterator[((int, int, str), GridPegSolitairePuzzle)]
+
+        >>> grid = [['*', '*', '*'], ['*', '*', '*'], ['*', '*', '.']]
+        >>> d = GridPegSolitairePuzzle(grid, {'#', '.', '*'})
+        >>> [move for move, _ in d.iter_moves()]
+        [(2, 0, 'R'), (0, 2, 'D')]
+        """
         n = len(self._marker[0])
         all_lst = gather_list(self._marker)
-        result = []
         i = 0
-        grid = []
         while i in range(len(all_lst)):
             if all_lst[i] == '.':
                 r = i // n
                 #check left
                 if i-2 in range(r*n, (r*n)+n) and all_lst[i-1] == '*' and all_lst[i-2] == "*":
-                    L = all_lst[:]
-                    L[i] = '*'
-                    L[i-1] = '.'
-                    L[i-2] = '.'
-                    grid = separate_list(L, n)
-                    result.append(GridPegSolitairePuzzle(grid, {'#', '.', '*'}))
+                    if (r, i % n - 2, 'R') != skip:
+                        yield (r, i % n - 2, 'R'), self._jump(all_lst, i-2, i-1, i)
                 #check right
                 if i+2 in range(r*n, (r*n)+n) and all_lst[i+1] == '*' and all_lst[i+2] == "*":
-                    R = all_lst[:]
-                    R[i] = '*'
-                    R[i+1] = '.'
-                    R[i+2] = '.'
-                    grid = separate_list(R, n)
-                    result.append(GridPegSolitairePuzzle(grid, {'#', '.', '*'}))
+                    if (r, i % n + 2, 'L') != skip:
+                        yield (r, i % n + 2, 'L'), self._jump(all_lst, i+2, i+1, i)
                 #check down
                 if i+(n*2) in range(len(all_lst)) and all_lst[i+n] == '*' and all_lst[i+(n*2)] == '*':
-                    D = all_lst[:]
-                    D[i] = '*'
-                    D[i+n] = '.'
-                    D[i+(n*2)] = '.'
-                    grid = separate_list(D, n)
-                    result.append(GridPegSolitairePuzzle(grid, {'#', '.', '*'}))
+                    if (r + 2, i % n, 'U') != skip:
+                        yield (r + 2, i % n, 'U'), self._jump(all_lst, i+(n*2), i+n, i)
                 #check up
                 if i-(n*2) in range(len(all_lst)) and all_lst[i-n] == '*' and all_lst[i-(n*2)] == '*':
-                    U = all_lst[:]
-                    U[i] = '*'
-                    U[i-n] = '.'
-                    U[i-(n*2)] = '.'
-                    grid = separate_list(U, n)
-                    result.append(GridPegSolitairePuzzle(grid, {'#', '.', '*'}))
+                    if (r - 2, i % n, 'D') != skip:
+                        yield (r - 2, i % n, 'D'), self._jump(all_lst, i-(n*2), i-n, i)
             i += 1
-        return result
+
+    def apply(self, move):
+        """
+        Return the extension of GridPegSolitairePuzzle self made by move,
+        as described in iter_moves.
+
+        @type self: GridPegSolitairePuzzle
+        @type move: (int, int, str)
+        @rtype: GridPegSolitairePuzzle
+
+        >>> grid = [['*', '*', '*'], ['*', '*', '*'], ['*', '*', '.']]
+        >>> d = GridPegSolitairePuzzle(grid, {'#', '.', '*'})
+        >>> print(d.apply((0, 2, 'D')))
+        **.
+        **.
+        ***
+        """
+        r, c, direction = move
+        n = len(self._marker[0])
+        dr, dc = _DIRECTIONS[direction]
+        all_lst = gather_list(self._marker)
+        source = r * n + c
+        over, target = source + dr * n + dc, source + 2 * (dr * n + dc)
+        assert (0 <= r + 2 * dr < len(self._marker) and 0 <= c + 2 * dc < n
+                and all_lst[source] == '*' and all_lst[over] == '*'
+                and all_lst[target] == '.'), "illegal move {!r}".format(move)
+        return self._jump(all_lst, source, over, target)
+
+    def _jump(self, all_lst, source, over, target):
+        # Return the GridPegSolitairePuzzle where, in the flat list
+        # all_lst of self's markers, the peg at source jumps over the one
+        # at over into target.
+        #
+        # @type self: GridPegSolitairePuzzle
+        # @type all_lst: list[str]
+        # @type source: int
+        # @type over: int
+        # @type target: int
+        # @rtype: GridPegSolitairePuzzle
+        L = all_lst[:]
+        L[target] = '*'
+        L[over] = '.'
+        L[source] = '.'
+        grid = separate_list(L, len(self._marker[0]))
+        return GridPegSolitairePuzzle(grid, {'#', '.', '*'})
 
 
 
@@ -188,10 +270,12 @@ class GridPegSolitairePuzzle(Puzzle):
         If there is only one extension and it just go back to the prev puzzle.
         """
         puzzle = self
-        if not self.extensions():
-            return True
-        elif len(self.extensions()) == 1 and len(self.extensions()[0].extensions()) == 1 and puzzle in self.extensions()[0].extensions():
+        extensions = self.extensions()
+        if not extensions:
             return True
+        elif len(extensions) == 1:
+            next_extensions = extensions[0].extensions()
+            return len(next_extensions) == 1 and puzzle in next_extensions
         else:
             return False
 
@@ -201,6 +285,10 @@ class GridPegSolitairePuzzle(Puzzle):
 
 
 #helper function
+# (row, column) step of each jump direction
+_DIRECTIONS = {'L': (0, -1), 'R': (0, 1), 'U': (-1, 0), 'D': (1, 0)}
+
+
 def gather_list(obj):
     if not isinstance(obj, list):
         return [obj]
@@ -233,20 +321,6 @@ def separate_list(d, n):
 
 if __name__ == "__main__":
     import doctest
-
     doctest.testmod()
-    from puzzle_tools import depth_first_solve
-
-    grid = [["*", "*", "*", "*", "*"],
-            ["*", "*", "*", "*", "*"],
-            ["*", "*", "*", "*", "*"],
-            ["*", "*", ".", "*", "*"],
-            ["*", "*", "*", "*", "*"]]
-    gpsp = GridPegSolitairePuzzle(grid, {"*", ".", "#"})
-    import time
-
-    start = time.time()
-    solution = depth_first_solve(gpsp)
-    end = time.time()
-    print("Solved 5x5 peg solitaire in {} seconds.".format(end - start))
-    print("Using depth-first: \n{}".format(solution))
+    from puzzle_benchmark import main
+    main(["peg-5x5", "--repeat", "1", "--warmup", "0", "--show"])
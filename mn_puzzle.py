@@ -1,4 +1,5 @@
 from puzzle import Puzzle
+import weakref
 
 
 class MNPuzzle(Puzzle):
@@ -7,14 +8,20 @@ class MNPuzzle(Puzzle):
     or even unsolvable.
     """
 
-    def __init__(self, from_grid, to_grid):
+    def __init__(self, from_grid, to_grid, heuristic=None):
         """
         MNPuzzle in state from_grid, working towards
         state to_grid
 
+        heuristic, if given, is called with each MNPuzzle to estimate its
+        distance from to_grid in place of Manhattan distance, for example
+        a pattern_database.PatternDatabase built for to_grid.  Extensions
+        share it.
+
         @param MNPuzzle self: this MNPuzzle
         @param tuple[tuple[str]] from_grid: current configuration
         @param tuple[tuple[str]] to_grid: solution configuration
+        @param (MNPuzzle) -> int | None heuristic: distance estimate
         @rtype: None
         """
         # represent grid symbols with letters or numerals
@@ -23,7 +30,45 @@ class MNPuzzle(Puzzle):
         assert all([len(r) == len(from_grid[0]) for r in from_grid])
         assert all([len(r) == len(to_grid[0]) for r in to_grid])
         self.n, self.m = len(from_grid), len(from_grid[0])
-        self.from_grid, self.to_grid = from_grid, to_grid
+        # the grid is kept packed in a flat bytes object, one code per
+        # symbol, with from_grid only built when asked for; everything
+        # shared by the puzzles of one search is in self._layout
+        self._layout = _layout(self.n, self.m, from_grid, to_grid)
+        codes = self._layout.codes
+        self._state = bytes([codes[s] for row in from_grid for s in row])
+        # positions of "*", in order; usually there is just one
+        self._blanks = tuple([i for i in range(len(self._state))
+                              if self._state[i] == codes.get("*")])
+        self._from_grid = from_grid
+        self._heuristic = heuristic
+        # whether to_grid can be reached, None until fail_fast finds out;
+        # moves keep it unchanged, so extensions inherit it
+        self._reachable = None
+
+    @property
+    def from_grid(self):
+        """
+        Return the current configuration of MNPuzzle self.
+
+        @type self: MNPuzzle
+        @rtype: tuple[tuple[str]]
+        """
+        if self._from_grid is None:
+            symbols, m = self._layout.symbols, self.m
+            self._from_grid = tuple([tuple([symbols[c] for c in
+                                            self._state[r * m:(r + 1) * m]])
+                                     for r in range(self.n)])
+        return self._from_grid
+
+    @property
+    def to_grid(self):
+        """
+        Return the solution configuration of MNPuzzle self.
+
+        @type self: MNPuzzle
+        @rtype: tuple[tuple[str]]
+        """
+        return self._layout.to_grid
 
     # TODO
     # implement __eq__ and __str__
@@ -46,7 +91,53 @@ class MNPuzzle(Puzzle):
         >>> m1.__eq__(m3)
         False
         """
-        return (type(self) == type(other) and self.from_grid == other.from_grid and self.to_grid == other.to_grid and self.n == other.n and self.n == other.n)
+        return (type(self) == type(other) and self._state == other._state and
+                self._layout.key == other._layout.key)
+
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return a hashable key identifying the configuration of MNPuzzle self.
+
+        @type self: MNPuzzle
+        @rtype: tuple
+        >>> target_grid = (("1", "2", "3"), ("4", "5", "*"))
+        >>> start_grid = (("*", "2", "3"), ("1", "4", "5"))
+        >>> m1 = MNPuzzle(start_grid, target_grid)
+        >>> m2 = MNPuzzle(start_grid, target_grid)
+        >>> m1.state_key() == m2.state_key()
+        True
+        >>> len({m1, m2})
+        1
+        """
+        return (self._state, self._layout.key)
+
+    def position_key(self):
+        """
+        Return a hashable key for the current grid of MNPuzzle self: its
+        packed state, which codes symbols the same way for self and
+        self.reverse().
+
+        @type self: MNPuzzle
+        @rtype: bytes
+        >>> m1 = MNPuzzle((("*", "1"),), (("1", "*"),))
+        >>> m1.position_key() == m1.reverse().extensions()[0].position_key()
+        True
+        """
+        return self._state
+
+    def reverse(self):
+        """
+        Return an MNPuzzle starting from to_grid and working towards
+        from_grid.
+
+        @type self: MNPuzzle
+        @rtype: MNPuzzle
+        >>> print(MNPuzzle((("*", "1"),), (("1", "*"),)).reverse())
+        1*
+        """
+        return MNPuzzle(self.to_grid, self.from_grid)
 
     def __str__(self):
         """
@@ -85,39 +176,133 @@ class MNPuzzle(Puzzle):
         >>> len(L1) == len(L2)
         True
         """
-        new_row = ()
-        result = []
-        new_grid = ()
-        other_row = ()
-        for row in self.from_grid:
-            r = self.from_grid.index(row)
-            if '*' in row:
-                i = row.index('*')
-                #check right
-                if i+1 in range(len(row)) and row[i+1] != '*':
-                    new_row = row[:i] + (row[i+1],) + (row[i],) + row[i+2:]
-                    new_grid = self.from_grid[:r] + (new_row,) + self.from_grid[r+1:]
-                    result.append(MNPuzzle(new_grid, self.to_grid))
-                #check left
-                if i-1 in range(len(row)) and row[i-1] != '*':
-                    new_row = row[:i-1] + (row[i],) + (row[i-1],) + row[i+1:]
-                    new_grid = self.from_grid[:r] + (new_row,) + self.from_grid[r+1:]
-                    result.append(MNPuzzle(new_grid, self.to_grid))
-                #check up
-                if r-1 in range(len(self.from_grid)) and self.from_grid[r-1][i]:
-                    new_row = row[:i] + (self.from_grid[r-1][i],) + row[i+1:]
-                    other_row = self.from_grid[r-1][:i] + ('*',) + self.from_grid[r-1][i+1:]
-                    new_grid = self.from_grid[:r-1] + (other_row,) + (new_row,) + self.from_grid[r+1:]
-                    result.append(MNPuzzle(new_grid, self.to_grid))
-                #check down
-                if r+1 in range(len(self.from_grid)) and self.from_grid[r+1][i]:
-                    new_row = row[:i] + (self.from_grid[r+1][i],) + row[i+1:]
-                    other_row = self.from_grid[r+1][:i] + ('*',) + self.from_grid[r+1][i+1:]
-                    new_grid = self.from_grid[:r] + (new_row,) + (other_row,) + self.from_grid[r+2:]
-                    result.append(MNPuzzle(new_grid, self.to_grid))
-
-        return result
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the extensions of MNPuzzle self one at a time, building each
+        only when it is asked for.
+
+        @type self: MNPuzzle
+        @rtype: Iterator[MNPuzzle]
+
+        >>> m1 = MNPuzzle((("*", "2", "3"), ("1", "4", "5")), (("1", "2", "3"), ("4", "5", "*")))
+        >>> print(next(m1.iter_extensions()))
+        2*3
+        145
+        """
+        for _, extension in self.iter_moves():
+            yield extension
+
+    def iter_moves(self, skip=None):
+        """
+        Yield (move, extension) for each extension of MNPuzzle self, where
+        move is the direction "*" moves in: "R", "L", "U" or "D", leaving
+        out move skip.  If from_grid has several "*", each of them moves
+        in turn, though never into another "*", and move is the pair
+        (position of the "*", direction).
+
+        @type self: MNPuzzle
+        @type skip: str | (int, str) | None
+        @rtype: Iterator[(str | (int, str), MNPuzzle)]
 
+        >>> m1 = MNPuzzle((("*", "2", "3"), ("1", "4", "5")), (("1", "2", "3"), ("4", "5", "*")))
+        >>> [move for move, _ in m1.iter_moves()]
+        ['R', 'D']
+        >>> [move for move, _ in m1.iter_moves("R")]
+        ['D']
+        >>> m2 = MNPuzzle((("*", "1"), ("2", "*")), (("1", "2"), ("*", "*")))
+        >>> sorted(["/".join(str(e).split()) for _, e in m2.iter_moves()])
+        ['**/21', '*1/*2', '1*/2*', '21/**']
+        >>> [move for move, _ in m2.iter_moves((0, "R"))]
+        [(0, 'D'), (3, 'L'), (3, 'U')]
+        """
+        blanks, table = self._blanks, _blank_moves(self.n, self.m)
+        if len(blanks) == 1:
+            b = blanks[0]
+            # swap "*" with each neighbour, right, left, up then down
+            for move, t in table[b].items():
+                if move != skip:
+                    yield move, self._swap(b, t)
+            return
+        state = self._state
+        for b in blanks:
+            for direction, t in table[b].items():
+                if state[t] != state[b] and (b, direction) != skip:
+                    yield (b, direction), self._swap(b, t)
+
+    def apply(self, move):
+        """
+        Return the extension of MNPuzzle self where "*" moves as move
+        says, as described in iter_moves.
+
+        @type self: MNPuzzle
+        @type move: str | (int, str)
+        @rtype: MNPuzzle
+
+        >>> m1 = MNPuzzle((("*", "2", "3"), ("1", "4", "5")), (("1", "2", "3"), ("4", "5", "*")))
+        >>> print(m1.apply("D"))
+        123
+        *45
+        """
+        if isinstance(move, str):
+            b, direction = self._blanks[0], move
+        else:
+            b, direction = move
+        return self._swap(b, _blank_moves(self.n, self.m)[b][direction])
+
+    def inverse(self, move):
+        """
+        Return the move undoing move: "*" going back the other way.
+
+        @type self: MNPuzzle
+        @type move: str | (int, str)
+        @rtype: str | (int, str)
+
+        >>> MNPuzzle((("*", "1"),), (("1", "*"),)).inverse("R")
+        'L'
+        >>> MNPuzzle((("*", "1", "*"),), (("1", "*", "*"),)).inverse((0, "R"))
+        (1, 'L')
+        """
+        if isinstance(move, str):
+            return _OPPOSITE[move]
+        b, direction = move
+        return (_blank_moves(self.n, self.m)[b][direction],
+                _OPPOSITE[direction])
+
+    def _swap(self, b, t):
+        # Return the extension of MNPuzzle self with "*" at position b
+        # swapped with the symbol at position t.
+        #
+        # @type self: MNPuzzle
+        # @type b: int
+        # @type t: int
+        # @rtype: MNPuzzle
+        cells = bytearray(self._state)
+        cells[b], cells[t] = cells[t], cells[b]
+        if len(self._blanks) == 1:
+            blanks = (t,)
+        else:
+            blanks = tuple(sorted([t if p == b else p for p in self._blanks]))
+        return self._child(bytes(cells), blanks)
+
+    def _child(self, state, blanks):
+        # Return the extension of MNPuzzle self with packed state state
+        # and "*" at the positions blanks.  It shares self's layout and
+        # inherits whether to_grid is reachable; __init__'s checks are
+        # skipped since self was already checked.
+        #
+        # @type self: MNPuzzle
+        # @type state: bytes
+        # @type blanks: tuple[int]
+        # @rtype: MNPuzzle
+        child = MNPuzzle.__new__(MNPuzzle)
+        child.n, child.m, child._layout = self.n, self.m, self._layout
+        child._state, child._blanks = state, blanks
+        child._from_grid = None
+        child._heuristic = self._heuristic
+        child._reachable = self._reachable
+        return child
 
     # TODO
     # override is_solved
@@ -139,29 +324,264 @@ class MNPuzzle(Puzzle):
         >>> m2.is_solved()
         True
         """
-        return (self.from_grid == self.to_grid)
+        return self._state == self._layout.goal
+
+    def positions(self, symbols):
+        """
+        Return the positions of symbols in MNPuzzle self, numbering the
+        positions of from_grid row by row from 0.
+
+        @type self: MNPuzzle
+        @type symbols: list[str]
+        @rtype: list[int]
+
+        >>> m1 = MNPuzzle((("*", "2", "3"), ("1", "4", "5")), (("1", "2", "3"), ("4", "5", "*")))
+        >>> m1.positions(["1", "*"])
+        [3, 0]
+        """
+        codes, state = self._layout.codes, self._state
+        return [state.find(codes[s]) for s in symbols]
+
+    def fail_fast(self):
+        """
+        Return True if to_grid cannot be reached from from_grid: the grids
+        differ in shape or in their multisets of symbols, or the sliding
+        moves cannot produce the needed permutation.
+
+        A move swaps "*" with a neighbour, which flips the parity of the
+        permutation taking from_grid to to_grid and of the distance "*"
+        must still travel, so on boards with at least two rows and
+        columns the two parities must agree.  Symbols need not be
+        digits, but a repeated symbol can always fix the parity, so such
+        grids are only checked for matching symbols.  On a single row or
+        column symbols can never pass each other.
+
+        The answer is the same for every extension, so it is computed for
+        the first puzzle checked and inherited by its extensions.
+
+        @type self: MNPuzzle
+        @rtype: bool
+
+        >>> goal = (("1", "2", "3"), ("4", "5", "*"))
+        >>> MNPuzzle((("*", "2", "3"), ("1", "4", "5")), goal).fail_fast()
+        False
+        >>> MNPuzzle((("2", "1", "3"), ("4", "5", "*")), goal).fail_fast()
+        True
+        >>> MNPuzzle((("1", "2", "3"), ("4", "6", "*")), goal).fail_fast()
+        True
+        >>> goal = (("a", "b"), ("c", "*"))
+        >>> MNPuzzle((("*", "a"), ("c", "b")), goal).fail_fast()
+        False
+        >>> MNPuzzle((("b", "a"), ("c", "*")), goal).fail_fast()
+        True
+        >>> MNPuzzle((("2", "*", "1"),), (("1", "2", "*"),)).fail_fast()
+        True
+        """
+        if self._reachable is None:
+            self._reachable = _reachable(self.from_grid, self.to_grid)
+        return not self._reachable
+
+    def heuristic(self):
+        """
+        Return the sum of the Manhattan distances of each symbol in
+        MNPuzzle self from its position in to_grid, or the estimate of
+        the heuristic self was made with.
+
+        @type self: MNPuzzle
+        @rtype: int
+
+        >>> target_grid = (("1", "2", "3"), ("4", "5", "*"))
+        >>> start_grid = (("*", "2", "3"), ("1", "4", "5"))
+        >>> MNPuzzle(start_grid, target_grid).heuristic()
+        3
+        >>> MNPuzzle(target_grid, target_grid).heuristic()
+        0
+        """
+        if self._heuristic is not None:
+            return self._heuristic(self)
+        distances = self._layout.distances
+        return sum([distances[code][i]
+                    for i, code in enumerate(self._state)])
 
 
 
 #helper function
+_blank_moves_cache = {}
+# each direction "*" can move in, and the one undoing it
+_OPPOSITE = {"R": "L", "L": "R", "U": "D", "D": "U"}
+# (n, m, to_grid, symbols) -> its _Layout, for as long as some puzzle
+# uses it
+_layout_cache = weakref.WeakValueDictionary()
+
 
+def _reachable(from_grid, to_grid):
+    """
+    Return whether sliding moves can take from_grid to to_grid, as
+    described in MNPuzzle.fail_fast.
+
+    @type from_grid: tuple[tuple[str]]
+    @type to_grid: tuple[tuple[str]]
+    @rtype: bool
+
+    >>> _reachable((("*", "1"), ("3", "2")), (("1", "2"), ("3", "*")))
+    True
+    """
+    if ([len(row) for row in from_grid] !=
+            [len(row) for row in to_grid]):
+        return False
+    start = [s for row in from_grid for s in row]
+    goal = [s for row in to_grid for s in row]
+    if sorted(start) != sorted(goal):
+        return False
+    if start.count("*") != 1:
+        # with no "*" nothing moves; with several, parity does not apply
+        return start == goal or start.count("*") > 1
+    n, m = len(from_grid), len(from_grid[0])
+    if n == 1 or m == 1:
+        return ([s for s in start if s != "*"] ==
+                [s for s in goal if s != "*"])
+    if len(set(start)) < len(start):
+        return True
+    # parity of the permutation taking start to goal, from its cycles
+    target = {goal[i]: i for i in range(len(goal))}
+    seen, cycles = [False] * len(start), 0
+    for i in range(len(start)):
+        if not seen[i]:
+            cycles += 1
+            j = i
+            while not seen[j]:
+                seen[j] = True
+                j = target[start[j]]
+    blank, goal_blank = start.index("*"), goal.index("*")
+    distance = (abs(blank // m - goal_blank // m) +
+                abs(blank % m - goal_blank % m))
+    return (len(start) - cycles) % 2 == distance % 2
+
+
+def _blank_moves(n, m):
+    """
+    Return a list giving, for each position of an nxm grid packed row by
+    row, a dict from each direction "*" can move in there to the
+    position it reaches: right, left, up then down.  The result is
+    cached per shape.
+
+    @type n: int
+    @type m: int
+    @rtype: list[dict[str, int]]
+
+    >>> _blank_moves(2, 3)[1]
+    {'R': 2, 'L': 0, 'D': 4}
+    """
+    if (n, m) not in _blank_moves_cache:
+        table = []
+        for i in range(n * m):
+            r, c = divmod(i, m)
+            moves = {}
+            if c + 1 < m:
+                moves["R"] = i + 1
+            if c > 0:
+                moves["L"] = i - 1
+            if r > 0:
+                moves["U"] = i - m
+            if r + 1 < n:
+                moves["D"] = i + m
+            table.append(moves)
+        _blank_moves_cache[(n, m)] = table
+    return _blank_moves_cache[(n, m)]
+
+
+def _neighbours(n, m):
+    """
+    Return a list giving, for each position of an nxm grid packed row by
+    row, the positions next to it: right, left, up then down.
+
+    @type n: int
+    @type m: int
+    @rtype: list[tuple[int]]
+
+    >>> _neighbours(2, 3)[1]
+    (2, 0, 4)
+    """
+    return [tuple(moves.values()) for moves in _blank_moves(n, m)]
+
+
+class _Layout:
+    """
+    What the MNPuzzles of one search share: how symbols are packed and
+    the packed goal.
+
+    === Attributes ===
+    @type to_grid: tuple[tuple[str]]
+        the solution configuration
+    @type symbols: tuple[str]
+        the symbols of both grids, in sorted order; each is packed as its
+        index here
+    @type codes: dict[str, int]
+        the index of each symbol in symbols
+    @type goal: bytes
+        to_grid packed
+    @type key: bytes
+        identifies the shapes, symbols and goal, for state_key
+    @type distances: list[tuple[int]]
+        for each code, the Manhattan distance from each position to the
+        nearest place of that symbol in to_grid; 0 for "*"
+    """
+
+    def __init__(self, n, m, symbols, to_grid):
+        """
+        Create the _Layout for nxm grids of symbols going to to_grid.
+
+        @type self: _Layout
+        @type n: int
+        @type m: int
+        @type symbols: tuple[str]
+        @type to_grid: tuple[tuple[str]]
+        @rtype: None
+        """
+        assert len(symbols) <= 256
+        self.to_grid, self.symbols = to_grid, symbols
+        self.codes = {symbols[i]: i for i in range(len(symbols))}
+        self.goal = bytes([self.codes[s] for row in to_grid for s in row])
+        self.key = (repr((n, m, len(to_grid), symbols)).encode() + b"\0" +
+                    self.goal)
+        places = {}
+        for gr in range(len(to_grid)):
+            for gc in range(len(to_grid[gr])):
+                places.setdefault(to_grid[gr][gc], []).append((gr, gc))
+        self.distances = [tuple([min([abs(i // m - gr) + abs(i % m - gc)
+                                      for (gr, gc) in places[s]])
+                                 if s != "*" and s in places else 0
+                                 for i in range(n * m)])
+                          for s in symbols]
+
+
+def _layout(n, m, from_grid, to_grid):
+    """
+    Return the _Layout for an nxm from_grid going to to_grid, shared per
+    goal and set of symbols while some puzzle uses it.  Symbols are those
+    of both grids, so a puzzle and its reverse pack grids the same way.
+
+    @type n: int
+    @type m: int
+    @type from_grid: tuple[tuple[str]]
+    @type to_grid: tuple[tuple[str]]
+    @rtype: _Layout
+
+    >>> layout = _layout(1, 2, (("*", "b"),), (("a", "*"),))
+    >>> layout.symbols, layout.goal
+    (('*', 'a', 'b'), b'\\x01\\x00')
+    """
+    symbols = tuple(sorted({s for grid in (from_grid, to_grid)
+                            for row in grid for s in row}))
+    key = (n, m, to_grid, symbols)
+    layout = _layout_cache.get(key)
+    if layout is None:
+        layout = _layout_cache[key] = _Layout(n, m, symbols, to_grid)
+    return layout
 
 
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
-    target_grid = (("1", "2", "3"), ("4", "5", "*"))
-    start_grid = (("*", "2", "3"), ("1", "4", "5"))
-    from puzzle_tools import breadth_first_solve, depth_first_solve
-    from time import time
-    start = time()
-    solution = breadth_first_solve(MNPuzzle(start_grid, target_grid))
-    end = time()
-    print("BFS solved: \n\n{} \n\nin {} seconds".format(
-        solution, end - start))
-    start = time()
-    solution = depth_first_solve((MNPuzzle(start_grid, target_grid)))
-    end = time()
-    print("DFS solved: \n\n{} \n\nin {} seconds".format(
-        solution, end - start))
-
+    from puzzle_benchmark import main
+    main(["mn-2x3", "--repeat", "1", "--warmup", "0", "--show"])
@@ -0,0 +1,284 @@
+"""
+Additive pattern database heuristics for MNPuzzle
+
+The tiles of a goal grid are split into disjoint groups.  For each group
+a table gives, for every placement of the group's tiles, the fewest
+moves of those tiles needed to bring them home, found by a breadth-first
+search backwards from the goal in which the other tiles are
+indistinguishable and moving them is free.  Since each move moves one
+tile, the table entries for the groups can be added and still never
+overestimate.
+
+Tables are built once per board shape, goal and grouping, saved to a
+file and loaded through mmap, so processes using the same file share
+one copy.  Run "python pattern_database.py --help" to build one from the
+command line.
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+from collections import deque
+from mn_puzzle import MNPuzzle, _neighbours
+from puzzle_tools import write_atomically
+
+# first line of a pattern database file
+MAGIC = b"MNPDB 1\n"
+# table entry for placements that cannot be reached
+UNREACHED = 255
+
+
+def default_groups(to_grid, size=4):
+    """
+    Return the symbols of to_grid other than "*", in row order, split
+    into groups of size.
+
+    @type to_grid: tuple[tuple[str]]
+    @type size: int
+    @rtype: list[list[str]]
+
+    >>> default_groups((("1", "2", "3"), ("4", "5", "*")), 2)
+    [['1', '2'], ['3', '4'], ['5']]
+    """
+    tiles = [s for row in to_grid for s in row if s != "*"]
+    return [tiles[i:i + size] for i in range(0, len(tiles), size)]
+
+
+def build_table(to_grid, group):
+    """
+    Return the table for the tiles in group of to_grid: a bytearray
+    whose entry at index sum(p[j] * N ** (k - 1 - j)) is the fewest moves
+    of group's tiles taking them from positions p to their places in
+    to_grid, where N is the number of positions and k the number of
+    tiles in group.
+
+    @type to_grid: tuple[tuple[str]]
+    @type group: list[str]
+    @rtype: bytearray
+
+    >>> table = build_table((("1", "2"), ("3", "*")), ["1"])
+    >>> list(table)
+    [0, 1, 1, 2]
+    """
+    n, m = len(to_grid), len(to_grid[0])
+    size, k = n * m, len(group)
+    goal = [s for row in to_grid for s in row]
+    assert goal.count("*") == 1 and all([goal.count(s) == 1 for s in group])
+    neighbours = _neighbours(n, m)
+    weights = [size ** (k - 1 - j) for j in range(k)]
+    table = bytearray([UNREACHED]) * size ** k
+    # fewest moves found so far for each (tiles index, blank position)
+    seen = bytearray([UNREACHED]) * size ** (k + 1)
+    tiles = tuple([goal.index(s) for s in group])
+    index = sum([tiles[j] * weights[j] for j in range(k)])
+    blank = goal.index("*")
+    seen[index * size + blank] = 0
+    # 0-1 breadth-first search: free moves go to the front of the queue,
+    # so entries leave it in order of moves
+    queue = deque([(0, tiles, index, blank)])
+    while queue:
+        moves, tiles, index, blank = queue.popleft()
+        if moves > seen[index * size + blank]:
+            continue
+        if moves < table[index]:
+            table[index] = moves
+        for t in neighbours[blank]:
+            if t in tiles:
+                j = tiles.index(t)
+                new_tiles = tiles[:j] + (blank,) + tiles[j + 1:]
+                new_index = index + (blank - t) * weights[j]
+                if moves + 1 < seen[new_index * size + t]:
+                    seen[new_index * size + t] = moves + 1
+                    queue.append((moves + 1, new_tiles, new_index, t))
+            elif moves < seen[index * size + t]:
+                seen[index * size + t] = moves
+                queue.appendleft((moves, tiles, index, t))
+    return table
+
+
+def build(to_grid, path, groups=None):
+    """
+    Build the tables for groups of to_grid (default_groups(to_grid) by
+    default) and save them as a pattern database file at path.
+
+    The file is MAGIC, a line of JSON describing the tables, then the
+    tables themselves.
+
+    @type to_grid: tuple[tuple[str]]
+    @type path: str
+    @type groups: list[list[str]] | None
+    @rtype: None
+    """
+    groups = default_groups(to_grid) if groups is None else groups
+    tables = [build_table(to_grid, group) for group in groups]
+    header = {"to_grid": [list(row) for row in to_grid], "groups": groups,
+              "sizes": [len(table) for table in tables]}
+    write_atomically(path, [MAGIC, json.dumps(header).encode() + b"\n"] +
+                     tables)
+
+
+def database_path(to_grid, groups=None, directory="."):
+    """
+    Return the path in directory of the pattern database file for groups
+    of to_grid, named after a digest of both.
+
+    @type to_grid: tuple[tuple[str]]
+    @type groups: list[list[str]] | None
+    @type directory: str
+    @rtype: str
+
+    >>> database_path((("1", "*"),)).startswith("./mn-1x2-")
+    True
+    """
+    groups = default_groups(to_grid) if groups is None else groups
+    digest = hashlib.sha1(json.dumps([to_grid, groups]).encode())
+    return os.path.join(directory, "mn-{}x{}-{}.pdb".format(
+        len(to_grid), len(to_grid[0]), digest.hexdigest()[:12]))
+
+
+class PatternDatabase:
+    """
+    The additive pattern database heuristic for one goal grid, loaded
+    from a file made by build.  Call it with an MNPuzzle working towards
+    that goal to get its estimate, or pass it as the heuristic of an
+    MNPuzzle so that informed solvers use it.
+
+    Pickling keeps only the path, so worker processes map the same file
+    rather than copying the tables.
+
+    === Attributes ===
+    @type path: str
+        the pattern database file
+    @type to_grid: tuple[tuple[str]]
+        the goal grid the tables are for
+    @type groups: list[list[str]]
+        the tiles of each table
+    """
+
+    def __init__(self, path):
+        """
+        Load the PatternDatabase self saved at path.
+
+        @type self: PatternDatabase
+        @type path: str
+        @rtype: None
+        """
+        self.path = path
+        with open(path, "rb") as source:
+            assert source.readline() == MAGIC, \
+                "not a pattern database: {}".format(path)
+            header = json.loads(source.readline())
+            offset = source.tell()
+            self._map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        self.to_grid = tuple([tuple(row) for row in header["to_grid"]])
+        self.groups = header["groups"]
+        self._tables, view = [], memoryview(self._map)
+        for size in header["sizes"]:
+            self._tables.append(view[offset:offset + size])
+            offset += size
+        self._size = len(self.to_grid) * len(self.to_grid[0])
+
+    def __getstate__(self):
+        """
+        Return what pickling keeps of PatternDatabase self: its path.
+
+        @type self: PatternDatabase
+        @rtype: str
+        """
+        return self.path
+
+    def __setstate__(self, path):
+        """
+        Load PatternDatabase self again from path after unpickling.
+
+        @type self: PatternDatabase
+        @type path: str
+        @rtype: None
+        """
+        self.__init__(path)
+
+    def __call__(self, puzzle):
+        """
+        Return the sum of the table entries of PatternDatabase self for
+        MNPuzzle puzzle, which must be working towards self.to_grid.
+
+        @type self: PatternDatabase
+        @type puzzle: MNPuzzle
+        @rtype: int
+        """
+        size, total = self._size, 0
+        for table, group in zip(self._tables, self.groups):
+            index = 0
+            for p in puzzle.positions(group):
+                index = index * size + p
+            total += table[index]
+        return total
+
+    def puzzle(self, from_grid):
+        """
+        Return an MNPuzzle from from_grid to self.to_grid that uses
+        PatternDatabase self as its heuristic.
+
+        @type self: PatternDatabase
+        @type from_grid: tuple[tuple[str]]
+        @rtype: MNPuzzle
+
+        >>> import tempfile
+        >>> goal = (("1", "2", "3"), ("4", "5", "*"))
+        >>> with tempfile.TemporaryDirectory() as directory:
+        ...     pdb = load_or_build(goal, [["1", "2", "3"], ["4", "5"]],
+        ...                         directory)
+        ...     p = pdb.puzzle((("*", "2", "3"), ("1", "4", "5")))
+        ...     print(p.heuristic(), pdb(MNPuzzle(goal, goal)))
+        3 0
+        """
+        return MNPuzzle(from_grid, self.to_grid, self)
+
+
+def load_or_build(to_grid, groups=None, directory="."):
+    """
+    Return the PatternDatabase for groups of to_grid (default_groups by
+    default) saved in directory, building and saving it first if there
+    is none yet.
+
+    @type to_grid: tuple[tuple[str]]
+    @type groups: list[list[str]] | None
+    @type directory: str
+    @rtype: PatternDatabase
+    """
+    path = database_path(to_grid, groups, directory)
+    if not os.path.exists(path):
+        build(to_grid, path, groups)
+    return PatternDatabase(path)
+
+
+def main(argv=None):
+    """
+    Build the pattern database for the standard goal of the board shape
+    given by the command line arguments argv (the process arguments by
+    default), and return the exit status.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description="Build an MNPuzzle pattern database.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("columns", type=int)
+    parser.add_argument("--group-size", type=int, default=4,
+                        help="tiles per table")
+    parser.add_argument("--directory", default=".",
+                        help="where to save the file")
+    args = parser.parse_args(argv)
+    n, m = args.rows, args.columns
+    symbols = [str(i + 1) for i in range(n * m - 1)] + ["*"]
+    to_grid = tuple([tuple(symbols[r * m:(r + 1) * m]) for r in range(n)])
+    groups = default_groups(to_grid, args.group_size)
+    print(load_or_build(to_grid, groups, args.directory).path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -39,3 +39,138 @@ class Puzzle:
         @rtype: list[Puzzle]
         """
         raise NotImplementedError
+
+    def iter_extensions(self):
+        """
+        Return an iterator over the legal extensions of Puzzle self.
+
+        Override this in a subclass with a generator that builds each
+        extension only when it is asked for, so that depth-first search
+        never builds the siblings of a branch that succeeds.
+
+        @type self: Puzzle
+        @rtype: Iterator[Puzzle]
+        """
+        return iter(self.extensions())
+
+    def iter_moves(self, skip=None):
+        """
+        Return an iterator over (move, extension) pairs for the legal
+        extensions of Puzzle self, where move is a small hashable
+        description of how extension is made from self, and
+        self.apply(move) makes it again.  The extension for move skip is
+        left out, and not built.
+
+        Override this in a subclass with a generator giving moves that
+        say what changes, such as a direction or a position and symbol;
+        by default a move is the extension's index in iter_extensions.
+
+        @type self: Puzzle
+        @type skip: Hashable | None
+        @rtype: Iterator[(Hashable, Puzzle)]
+        """
+        return ((index, extension) for index, extension
+                in enumerate(self.iter_extensions()) if index != skip)
+
+    def apply(self, move):
+        """
+        Return the extension of Puzzle self that iter_moves pairs with
+        move.
+
+        Override this together with iter_moves.
+
+        @type self: Puzzle
+        @type move: Hashable
+        @rtype: Puzzle
+        """
+        for index, extension in enumerate(self.iter_extensions()):
+            if index == move:
+                return extension
+        raise ValueError("no move {!r}".format(move))
+
+    def inverse(self, move):
+        """
+        Return the move that undoes move: applied to self.apply(move), it
+        gives back a puzzle equivalent to Puzzle self.  Return None if no
+        move does.
+
+        Solvers skip the inverse of the move that made a puzzle, since it
+        only leads back to the puzzle's parent.  Override this in a
+        subclass where moves can be undone.
+
+        @type self: Puzzle
+        @type move: Hashable
+        @rtype: Hashable | None
+        """
+        return None
+
+    def heuristic(self):
+        """
+        Return an estimate of the number of extensions needed to get from
+        Puzzle self to a solution.
+
+        Override this in a subclass to guide informed solvers such as
+        astar_solve.  The estimate must never exceed the true number
+        of steps, or those solvers may miss the shortest solution.
+
+        @type self: Puzzle
+        @rtype: int
+        """
+        return 0
+
+    def state_key(self):
+        """
+        Return a hashable key identifying the configuration of Puzzle self.
+
+        Puzzles with equal keys are interchangeable for searching, so
+        solvers use the key to remember which configurations they have
+        already seen.
+
+        This is an abstract method that must be implemented
+        in a subclass.
+
+        @type self: Puzzle
+        @rtype: Hashable
+        """
+        raise NotImplementedError
+
+    def position_key(self):
+        """
+        Return a hashable key for the current configuration of Puzzle self,
+        ignoring the configuration it is working towards.
+
+        Override this in a subclass that carries an explicit goal, so that
+        bidirectional_solve can tell when its two searches meet.
+
+        @type self: Puzzle
+        @rtype: Hashable
+        """
+        return self.state_key()
+
+    def reverse(self):
+        """
+        Return a Puzzle in the configuration Puzzle self is working
+        towards, working towards the current configuration of self.
+
+        Only puzzles whose extensions can all be undone by another
+        extension can be searched from both ends.
+
+        This is an abstract method that must be implemented
+        in a subclass that supports bidirectional_solve.
+
+        @type self: Puzzle
+        @rtype: Puzzle
+        """
+        raise NotImplementedError
+
+    def __hash__(self):
+        """
+        Return a hash of Puzzle self, based on its state_key.
+
+        Subclasses that override __eq__ must set __hash__ = Puzzle.__hash__
+        since Python otherwise makes them unhashable.
+
+        @type self: Puzzle
+        @rtype: int
+        """
+        return hash(self.state_key())
@@ -0,0 +1,411 @@
+"""
+Benchmarks for the solvers in puzzle_tools
+
+Run "python puzzle_benchmark.py --help" for the command line options.
+Results can be saved as JSON with --json and compared against an
+earlier save with --baseline, so that a slower solver shows up as a
+regression.
+"""
+import argparse
+import json
+import sys
+import tempfile
+from random import Random
+from time import perf_counter
+from mn_puzzle import MNPuzzle
+from sudoku_puzzle import SudokuPuzzle
+from grid_peg_solitaire_puzzle import GridPegSolitairePuzzle
+from word_ladder_puzzle import WordLadderPuzzle
+from pattern_database import load_or_build
+from word_dictionary import load_or_compile
+from puzzle_tools import (breadth_first_solve, depth_first_solve,
+                          astar_solve, ida_star_solve, bidirectional_solve,
+                          path_puzzles, SearchStats)
+
+
+def exact_cover_solve(puzzle, stats=None):
+    """
+    Return the solution path of SudokuPuzzle puzzle found by its Dancing
+    Links solve mode, or None if it has none.
+
+    stats is accepted so this can be run like the solvers in
+    puzzle_tools, but nothing is recorded in it: there is no search over
+    extensions to count.
+
+    @type puzzle: SudokuPuzzle
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode | None
+    """
+    return puzzle.solve("dlx")
+
+
+def backtrack_solve(puzzle, stats=None):
+    """
+    Return the solution path of SudokuPuzzle puzzle found by its in-place
+    backtracking solve mode, or None if it has none.
+
+    As for exact_cover_solve, nothing is recorded in stats.
+
+    @type puzzle: SudokuPuzzle
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode | None
+    """
+    return puzzle.solve("backtrack")
+
+
+# solvers that can be selected by name
+SOLVERS = {"dfs": depth_first_solve,
+           "bfs": breadth_first_solve,
+           "astar": astar_solve,
+           "ida": ida_star_solve,
+           "bidirectional": bidirectional_solve,
+           "dlx": exact_cover_solve,
+           "backtrack": backtrack_solve}
+
+
+def scrambled_mn_puzzle(n, m, moves, seed=0):
+    """
+    Return an nxm MNPuzzle made by a random walk of moves steps away
+    from the standard solved grid, using seed for the random choices.
+
+    @type n: int
+    @type m: int
+    @type moves: int
+    @type seed: int
+    @rtype: MNPuzzle
+
+    >>> p = scrambled_mn_puzzle(2, 3, 0)
+    >>> print(p)
+    123
+    45*
+    >>> scrambled_mn_puzzle(3, 3, 20, 1) == scrambled_mn_puzzle(3, 3, 20, 1)
+    True
+    """
+    symbols = [str(i + 1) for i in range(n * m - 1)] + ["*"]
+    goal = tuple([tuple(symbols[r * m:(r + 1) * m]) for r in range(n)])
+    rng = Random(seed)
+    puzzle = MNPuzzle(goal, goal)
+    for _ in range(moves):
+        puzzle = rng.choice(puzzle.extensions())
+    return puzzle
+
+
+def count_expansions(solver, puzzle):
+    """
+    Return (solution, expansions, seconds) for running solver on puzzle,
+    where expansions is the number of puzzles the solver expanded.
+
+    @type solver: (Puzzle, SearchStats) -> PuzzleNode | None
+    @type puzzle: Puzzle
+    @rtype: (PuzzleNode | None, int, float)
+
+    >>> sol, nodes, secs = count_expansions(breadth_first_solve,
+    ...                                     scrambled_mn_puzzle(2, 3, 3))
+    >>> nodes > 0
+    True
+    """
+    stats = SearchStats()
+    start = perf_counter()
+    solution = solver(puzzle, stats)
+    return solution, stats.expanded, perf_counter() - start
+
+
+def scaling_report(solver, n=3, m=3, depths=(5, 10, 20, 40, 80), seed=0):
+    """
+    Return lines reporting nodes expanded and nodes per second for solver
+    on nxm MNPuzzles scrambled to each depth in depths.
+
+    With a constant-time closed set the nodes per second figure should
+    stay roughly flat as the number of nodes grows.
+
+    @type solver: (Puzzle, SearchStats) -> PuzzleNode | None
+    @type n: int
+    @type m: int
+    @type depths: tuple[int]
+    @type seed: int
+    @rtype: list[str]
+    """
+    lines = ["{:>6} {:>10} {:>10} {:>12}".format(
+        "depth", "nodes", "seconds", "nodes/sec")]
+    for depth in depths:
+        puzzle = scrambled_mn_puzzle(n, m, depth, seed)
+        _, nodes, seconds = count_expansions(solver, puzzle)
+        rate = nodes / seconds if seconds > 0 else float("inf")
+        lines.append("{:>6} {:>10} {:>10.4f} {:>12.0f}".format(
+            depth, nodes, seconds, rate))
+    return lines
+
+
+# the instances the puzzle modules used to time in their main blocks
+def _mn_2x3():
+    return MNPuzzle((("*", "2", "3"), ("1", "4", "5")),
+                    (("1", "2", "3"), ("4", "5", "*")))
+
+
+def _mn_3x3_scrambled():
+    return scrambled_mn_puzzle(3, 3, 80)
+
+
+def _mn_3x4_scrambled():
+    return scrambled_mn_puzzle(3, 4, 200, 3)
+
+
+def _mn_3x4_pattern_database():
+    # the tables are built into the temporary directory on first use
+    puzzle = _mn_3x4_scrambled()
+    database = load_or_build(puzzle.to_grid, directory=tempfile.gettempdir())
+    return database.puzzle(puzzle.from_grid)
+
+
+def _sudoku_july_9_2015():
+    return SudokuPuzzle(9,
+                        ["*", "*", "*", "7", "*", "8", "*", "1", "*",
+                         "*", "*", "7", "*", "9", "*", "*", "*", "6",
+                         "9", "*", "3", "1", "*", "*", "*", "*", "*",
+                         "3", "5", "*", "8", "*", "*", "6", "*", "1",
+                         "*", "*", "*", "*", "*", "*", "*", "*", "*",
+                         "1", "*", "6", "*", "*", "9", "*", "4", "8",
+                         "*", "*", "*", "*", "*", "1", "2", "*", "7",
+                         "8", "*", "*", "*", "7", "*", "4", "*", "*",
+                         "*", "6", "*", "3", "*", "2", "*", "*", "*"],
+                        {"1", "2", "3", "4", "5", "6", "7", "8", "9"})
+
+
+def _sudoku_3_star():
+    return SudokuPuzzle(9,
+                        ["*", "*", "*", "9", "*", "2", "*", "*", "*",
+                         "*", "9", "1", "*", "*", "*", "6", "3", "*",
+                         "*", "3", "*", "*", "7", "*", "*", "8", "*",
+                         "3", "*", "*", "*", "*", "*", "*", "*", "8",
+                         "*", "*", "9", "*", "*", "*", "2", "*", "*",
+                         "5", "*", "*", "*", "*", "*", "*", "*", "7",
+                         "*", "7", "*", "*", "8", "*", "*", "4", "*",
+                         "*", "4", "5", "*", "*", "*", "8", "1", "*",
+                         "*", "*", "*", "3", "*", "6", "*", "*", "*"],
+                        {"1", "2", "3", "4", "5", "6", "7", "8", "9"})
+
+
+def _sudoku_4_star():
+    return SudokuPuzzle(9,
+                        ["5", "6", "*", "*", "*", "7", "*", "*", "9",
+                         "*", "7", "*", "*", "4", "8", "*", "3", "1",
+                         "*", "*", "*", "*", "*", "*", "*", "*", "*",
+                         "4", "3", "*", "*", "*", "*", "*", "*", "*",
+                         "*", "8", "*", "*", "*", "*", "*", "9", "*",
+                         "*", "*", "*", "*", "*", "*", "*", "2", "6",
+                         "*", "*", "*", "*", "*", "*", "*", "*", "*",
+                         "1", "9", "*", "3", "6", "*", "*", "7", "*",
+                         "7", "*", "*", "1", "*", "*", "*", "4", "2"],
+                        {"1", "2", "3", "4", "5", "6", "7", "8", "9"})
+
+
+def _sudoku_16x16():
+    symbols = (
+        "A**12*9*D*3****B*2*4D**A7***5****679**4*1B*E**DFB*E*65**8******C"
+        "***D*4B3*98*A*6***461*753C*0*B**E9F**0A*21***4583*5B****4*7*1***"
+        "910*8**2A5*4B*36**68*1E0C****9*A***C*******2D0E*4******B6****1*2"
+        "D**0*98E*2**6F*3*B923**1E74DC*8**F*3*******1E*****A****D********")
+    return SudokuPuzzle(16, list(symbols), set("0123456789ABCDEF"))
+
+
+def _peg_5x5():
+    grid = [["*", "*", "*", "*", "*"],
+            ["*", "*", "*", "*", "*"],
+            ["*", "*", "*", "*", "*"],
+            ["*", "*", ".", "*", "*"],
+            ["*", "*", "*", "*", "*"]]
+    return GridPegSolitairePuzzle(grid, {"*", ".", "#"})
+
+
+def _ladder_same_cost():
+    # the words are compiled into the temporary directory on first use
+    words = load_or_compile("words", tempfile.gettempdir())
+    return WordLadderPuzzle("same", "cost", words)
+
+
+# name -> (description, function building the puzzle, default solvers)
+INSTANCES = {
+    "mn-2x3": ("2x3 MNPuzzle from mn_puzzle.py",
+               _mn_2x3, ("bfs", "dfs", "astar", "ida", "bidirectional")),
+    "mn-3x3": ("3x3 MNPuzzle scrambled by 80 random moves",
+               _mn_3x3_scrambled, ("bfs", "astar", "ida", "bidirectional")),
+    "mn-3x4": ("3x4 MNPuzzle scrambled by 200 random moves",
+               _mn_3x4_scrambled, ("astar", "ida")),
+    "mn-3x4-pdb": ("mn-3x4 with additive pattern database heuristic",
+                   _mn_3x4_pattern_database, ("astar", "ida")),
+    "sudoku-july-9-2015": ("9x9 sudoku from July 9 2015 Star",
+                           _sudoku_july_9_2015, ("dfs", "dlx", "backtrack")),
+    "sudoku-3-star": ("3-star 9x9 sudoku, That's Puzzling, Nov 14 2015",
+                      _sudoku_3_star, ("dfs", "dlx", "backtrack")),
+    "sudoku-4-star": ("4-star 9x9 sudoku, That's Puzzling, Nov 14 2015",
+                      _sudoku_4_star, ("dfs", "dlx", "backtrack")),
+    "sudoku-16x16": ("16x16 sudoku, one solution, 55% of positions empty",
+                     _sudoku_16x16, ("dlx", "backtrack")),
+    "peg-5x5": ("5x5 peg solitaire from grid_peg_solitaire_puzzle.py",
+                _peg_5x5, ("dfs",)),
+    "ladder-same-cost": ("same -> cost word ladder over the words file",
+                         _ladder_same_cost, ("bidirectional", "bfs")),
+}
+
+
+def run_benchmark(name, solver_name, repeat=3, warmup=1):
+    """
+    Return a dict of results for solving instance name with the solver
+    called solver_name, repeat timed times after warmup untimed runs.
+
+    Every timed run records a SearchStats, so runs are comparable with
+    each other and with a saved baseline; the counters of the first run
+    are reported.
+
+    @type name: str
+    @type solver_name: str
+    @type repeat: int
+    @type warmup: int
+    @rtype: dict
+
+    >>> result = run_benchmark("mn-2x3", "bfs", repeat=2, warmup=0)
+    >>> len(result["seconds"]), result["path_length"]
+    (2, 4)
+    """
+    solver = SOLVERS[solver_name]
+    puzzle = INSTANCES[name][1]()
+    for _ in range(warmup):
+        solver(puzzle)
+    seconds, first_stats, solution = [], None, None
+    for _ in range(repeat):
+        stats = SearchStats()
+        start = perf_counter()
+        solution = solver(puzzle, stats)
+        seconds.append(perf_counter() - start)
+        if first_stats is None:
+            first_stats = stats
+    ordered = sorted(seconds)
+    median = ordered[len(ordered) // 2]
+    return {"instance": name, "solver": solver_name,
+            "seconds": seconds, "min": ordered[0], "median": median,
+            "path_length": (len(path_puzzles(solution))
+                            if solution is not None else None),
+            "expanded": first_stats.expanded,
+            "generated": first_stats.generated,
+            "nodes_per_second": (first_stats.expanded / median
+                                 if median > 0 else None),
+            "stats": first_stats.as_dict(),
+            "solution": solution}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return (lines, regressed) comparing the median times in results with
+    those for the same instance and solver in baseline, where regressed
+    is True iff some median grew by more than tolerance, a fraction.
+
+    @type results: list[dict]
+    @type baseline: dict
+    @type tolerance: float
+    @rtype: (list[str], bool)
+
+    >>> base = {"results": [{"instance": "a", "solver": "bfs",
+    ...                      "median": 1.0}]}
+    >>> lines, regressed = compare([{"instance": "a", "solver": "bfs",
+    ...                              "median": 1.5}], base, 0.2)
+    >>> regressed
+    True
+    >>> compare([{"instance": "a", "solver": "bfs", "median": 1.1}],
+    ...         base, 0.2)[1]
+    False
+    """
+    old = {(r["instance"], r["solver"]): r["median"]
+           for r in baseline["results"]}
+    lines, regressed = [], False
+    for result in results:
+        key = (result["instance"], result["solver"])
+        if key not in old:
+            lines.append("{}/{}: not in baseline".format(*key))
+            continue
+        ratio = result["median"] / old[key] if old[key] > 0 else 1.0
+        verdict = "ok"
+        if ratio > 1 + tolerance:
+            verdict, regressed = "REGRESSION", True
+        lines.append("{}/{}: {:.4f}s vs {:.4f}s ({:.2f}x) {}".format(
+            key[0], key[1], result["median"], old[key], ratio, verdict))
+    return lines, regressed
+
+
+def main(argv=None):
+    """
+    Run the benchmarks selected by the command line arguments argv (the
+    process arguments by default) and return the exit status: 1 if a
+    regression against the baseline was found, 0 otherwise.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the puzzle solvers.")
+    parser.add_argument("instances", nargs="*",
+                        help="instances to run (default: all); "
+                             "see --list")
+    parser.add_argument("--solver", action="append", choices=list(SOLVERS),
+                        help="solver to run, may be repeated "
+                             "(default: each instance's own)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per benchmark")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="untimed runs before timing")
+    parser.add_argument("--json", help="file to save results to")
+    parser.add_argument("--baseline", help="saved results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown against the baseline, "
+                             "as a fraction")
+    parser.add_argument("--show", action="store_true",
+                        help="print the last puzzle of each solution")
+    parser.add_argument("--list", action="store_true",
+                        help="list the instances and exit")
+    parser.add_argument("--scaling", action="store_true",
+                        help="report nodes per second on scrambled 3x3 "
+                             "MNPuzzles of growing depth and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name in INSTANCES:
+            print("{:<20} {} [{}]".format(name, INSTANCES[name][0],
+                                          ", ".join(INSTANCES[name][2])))
+        return 0
+    if args.scaling:
+        for solver_name in args.solver or ["bfs", "astar"]:
+            print("{} on 3x3 MNPuzzle".format(solver_name))
+            print("\n".join(scaling_report(SOLVERS[solver_name])))
+        return 0
+
+    results = []
+    for name in args.instances or list(INSTANCES):
+        if name not in INSTANCES:
+            parser.error("unknown instance {}".format(name))
+        for solver_name in args.solver or INSTANCES[name][2]:
+            result = run_benchmark(name, solver_name, args.repeat,
+                                   args.warmup)
+            print("{}/{}: median {:.4f}s, min {:.4f}s, expanded {}, "
+                  "path length {}".format(name, solver_name,
+                                          result["median"], result["min"],
+                                          result["expanded"],
+                                          result["path_length"]))
+            if args.show and result["solution"] is not None:
+                print(path_puzzles(result["solution"])[-1])
+            del result["solution"]
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"python": sys.version, "results": results}, out,
+                      indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as saved:
+            lines, regressed = compare(results, json.load(saved),
+                                       args.tolerance)
+        print("\n".join(lines))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
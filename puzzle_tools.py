@@ -3,13 +3,15 @@ Some functions for working with puzzles
 """
 from puzzle import Puzzle
 from collections import deque
-# set higher recursion limit
-# which is needed in PuzzleNode.__str__
-# uncomment the next two lines on a unix platform, say CDF
-# import resource
-# resource.setrlimit(resource.RLIMIT_STACK, (2**29, -1))
-import sys
-sys.setrecursionlimit(10**6)
+from heapq import heappush, heappop
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import closing
+from itertools import islice
+from multiprocessing import Event
+from operator import methodcaller
+import os
+import tempfile
+from time import perf_counter
 
 
 # TODO
@@ -17,52 +19,70 @@ sys.setrecursionlimit(10**6)
 # do NOT change the type contract
 # you are welcome to create any helper functions
 # you like
-def depth_first_solve(puzzle):
+def depth_first_solve(puzzle, stats=None):
     """
     Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
     a solution, with each child containing an extension of the puzzle
     in its parent.  Return None if this is not possible.
 
+    If stats is given, the search is recorded in it.
+
     @type puzzle: Puzzle
+    @type stats: SearchStats | None
     @rtype: PuzzleNode
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"cat", "cot", "cog", "dog", "dot"}
+    >>> sol = depth_first_solve(WordLadderPuzzle("cat", "dog", ws))
+    >>> print(path_puzzles(sol)[-1])
+    dog -> dog
+    >>> stats = SearchStats()
+    >>> sol = depth_first_solve(WordLadderPuzzle("cat", "dog", ws), stats)
+    >>> stats.expanded > 0 and stats.generated >= stats.expanded
+    True
     """
+    stats = _NO_STATS if stats is None else stats
+    fail_fast = stats.timed("fail_fast", _fail_fast)
+    is_solved = stats.timed("is_solved", _is_solved)
     if not puzzle:
         return None
-    elif puzzle.fail_fast():
+    elif fail_fast(puzzle):
         return None
-    elif puzzle.is_solved():
+    elif is_solved(puzzle):
         return PuzzleNode(puzzle)
     else:
-        check_dq = deque()
-        parent = PuzzleNode(puzzle)
-        extension = puzzle.extensions()
-        past_puzzle = [puzzle]
-        for puzzle in extension:
-            check_dq.append(PuzzleNode(puzzle, [], parent))
-
-        current_puzzle = check_dq[0]
-        past_puzzle.append(current_puzzle.puzzle)
-        while not(current_puzzle.puzzle.is_solved() or
-                  len(check_dq) == 0):
-            check_dq.popleft()
-            if not(current_puzzle.puzzle.fail_fast()):
-                extra_extension = current_puzzle.puzzle.extensions()
-                for puzzle in extra_extension:
-                    if not(puzzle in past_puzzle):
-                        new_node = PuzzleNode(puzzle, [], current_puzzle)
-                        check_dq.appendleft(new_node)
-
-            if check_dq:
-                current_puzzle = check_dq[0]
-                past_puzzle.append(current_puzzle.puzzle)
-
-        if check_dq == 0:
-            return None
-        else:
-            while current_puzzle.parent is not None:
-                current_puzzle.parent.children = [current_puzzle]
-                current_puzzle = current_puzzle.parent
-            return current_puzzle
+        advance = stats.timed("extensions", next)
+        tree = _SearchTree(puzzle)
+        # each entry pairs a puzzle's index in tree with a generator of its
+        # (move, extension) pairs, so siblings are only built if a branch
+        # fails
+        stats.expand(puzzle)
+        check_stack = [(0, puzzle, puzzle.iter_moves())]
+        # state keys of puzzles already seen, for O(1) duplicate checks
+        past_puzzle = {puzzle.state_key()}
+        while check_stack:
+            current_index, current_puzzle, moves = check_stack[-1]
+            pair = advance(moves, None)
+            if pair is None:
+                check_stack.pop()
+                continue
+            move, extension = pair
+            key = extension.state_key()
+            duplicate = key in past_puzzle
+            stats.generate(duplicate)
+            if duplicate:
+                continue
+            past_puzzle.add(key)
+            new_index = tree.add(move, current_index)
+            if is_solved(extension):
+                return tree.path(new_index)
+            if not fail_fast(extension):
+                stats.expand(extension)
+                back = current_puzzle.inverse(move)
+                check_stack.append((new_index, extension,
+                                    extension.iter_moves(back)))
+                stats.frontier(len(check_stack))
+        return None
 
 
 # TODO
@@ -73,52 +93,963 @@ def depth_first_solve(puzzle):
 # Hint: you may find a queue useful, that's why
 # we imported deque
 
-def breadth_first_solve(puzzle):
+def breadth_first_solve(puzzle, stats=None):
     """
     Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
     a solution, with each child PuzzleNode containing an extension
     of the puzzle in its parent.  Return None if this is not possible.
 
+    If stats is given, the search is recorded in it.
+
+    @type puzzle: Puzzle
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"cat", "cot", "cog", "dog", "dot"}
+    >>> sol = breadth_first_solve(WordLadderPuzzle("cat", "dog", ws))
+    >>> [str(p) for p in path_puzzles(sol)]
+    ['cat -> dog', 'cot -> dog', 'dot -> dog', 'dog -> dog']
+    """
+    stats = _NO_STATS if stats is None else stats
+    fail_fast = stats.timed("fail_fast", _fail_fast)
+    is_solved = stats.timed("is_solved", _is_solved)
+    if not puzzle:
+        return None
+    elif fail_fast(puzzle):
+        return None
+    elif is_solved(puzzle):
+        return PuzzleNode(puzzle)
+    else:
+        moves = stats.timed("extensions", _moves)
+        tree = _SearchTree(puzzle)
+        # (index in tree, puzzle, move back to its parent) for each puzzle
+        # waiting to be checked
+        check_dq = deque([(0, puzzle, None)])
+        # state keys of puzzles already queued, for O(1) duplicate checks
+        past_puzzle = {puzzle.state_key()}
+        while check_dq:
+            current_index, current_puzzle, back = check_dq.popleft()
+            if is_solved(current_puzzle):
+                return tree.path(current_index)
+            if not fail_fast(current_puzzle):
+                stats.expand(current_puzzle)
+                for move, extension in moves(current_puzzle, back):
+                    key = extension.state_key()
+                    duplicate = key in past_puzzle
+                    stats.generate(duplicate)
+                    if not duplicate:
+                        past_puzzle.add(key)
+                        check_dq.append((tree.add(move, current_index),
+                                         extension,
+                                         current_puzzle.inverse(move)))
+                stats.frontier(len(check_dq))
+        return None
+
+
+def astar_solve(puzzle, stats=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, with each child PuzzleNode containing an
+    extension of the puzzle in its parent.  Return None if this is
+    not possible.
+
+    Puzzles are expanded in order of steps taken so far plus
+    puzzle.heuristic().  A puzzle already expanded is expanded again if
+    a shorter path to it turns up, so the path is shortest as long as
+    the heuristic never overestimates, even if it is not consistent.
+
     @type puzzle: Puzzle
+    @type stats: SearchStats | None
     @rtype: PuzzleNode
+
+    >>> from mn_puzzle import MNPuzzle
+    >>> target_grid = (("1", "2", "3"), ("4", "5", "*"))
+    >>> start_grid = (("*", "2", "3"), ("1", "4", "5"))
+    >>> sol = astar_solve(MNPuzzle(start_grid, target_grid))
+    >>> len(path_puzzles(sol)) - 1
+    3
+    >>> print(path_puzzles(sol)[-1])
+    123
+    45*
+    >>> def patchy(p):
+    ...     # never overestimates, but is not consistent: the Manhattan
+    ...     # distance for some positions and 0 for the rest
+    ...     plain = MNPuzzle(p.from_grid, p.to_grid).heuristic()
+    ...     return plain if p.position_key()[0] % 3 == 0 else 0
+    >>> start_grid = (("5", "*", "1"), ("3", "4", "2"))
+    >>> sol = astar_solve(MNPuzzle(start_grid, target_grid, patchy))
+    >>> len(path_puzzles(sol)) - 1
+    12
     """
+    stats = _NO_STATS if stats is None else stats
+    fail_fast = stats.timed("fail_fast", _fail_fast)
+    is_solved = stats.timed("is_solved", _is_solved)
     if not puzzle:
         return None
-    elif puzzle.fail_fast():
+    elif fail_fast(puzzle):
         return None
-    elif puzzle.is_solved():
+    elif is_solved(puzzle):
         return PuzzleNode(puzzle)
     else:
-        check_dq = deque()
-        parent = PuzzleNode(puzzle)
-        extension = puzzle.extensions()
-        past_puzzle = [puzzle]
-        for puzzle in extension:
-            check_dq.append(PuzzleNode(puzzle, [], parent))
-
-        current_puzzle = check_dq[0]
-        past_puzzle.append(current_puzzle.puzzle)
-        while not(current_puzzle.puzzle.is_solved() or
-                  len(check_dq) == 0):
-            check_dq.popleft()
-            if not(current_puzzle.puzzle.fail_fast()):
-                extra_extension = current_puzzle.puzzle.extensions()
-                for puzzle in extra_extension:
-                    if not(puzzle in past_puzzle):
-                        past_puzzle.append(puzzle)
-                        new_node = PuzzleNode(puzzle, [], current_puzzle)
-                        check_dq.append(new_node)
-
-            if check_dq:
-                current_puzzle = check_dq[0]
-
-        if check_dq == 0:
+        moves = stats.timed("extensions", _moves)
+        tree = _SearchTree(puzzle)
+        # entries are (steps + heuristic, steps, index in tree, puzzle,
+        # move back to its parent); indices are unique, so puzzles
+        # themselves are never compared
+        frontier = [(puzzle.heuristic(), 0, 0, puzzle, None)]
+        # fewest steps found so far to each state key
+        best_steps = {puzzle.state_key(): 0}
+        while frontier:
+            _, steps, current_index, current_puzzle, back = heappop(frontier)
+            if steps > best_steps[current_puzzle.state_key()]:
+                # a shorter path to it was found after this entry
+                continue
+            if is_solved(current_puzzle):
+                return tree.path(current_index)
+            if fail_fast(current_puzzle):
+                continue
+            stats.expand(current_puzzle)
+            for move, extension in moves(current_puzzle, back):
+                ext_key = extension.state_key()
+                if steps + 1 < best_steps.get(ext_key, steps + 2):
+                    stats.generate(False)
+                    best_steps[ext_key] = steps + 1
+                    heappush(frontier, (steps + 1 + extension.heuristic(),
+                                        steps + 1,
+                                        tree.add(move, current_index),
+                                        extension,
+                                        current_puzzle.inverse(move)))
+                else:
+                    stats.generate(True)
+            stats.frontier(len(frontier))
+        return None
+
+
+def ida_star_solve(puzzle, stats=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, with each child PuzzleNode containing an
+    extension of the puzzle in its parent.  Return None if this is
+    not possible.
+
+    Unlike astar_solve, only the puzzles on the current path are kept,
+    so memory use stays flat: a depth-first search is repeated with a
+    growing bound on steps taken plus puzzle.heuristic().
+
+    @type puzzle: Puzzle
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode
+
+    >>> from mn_puzzle import MNPuzzle
+    >>> target_grid = (("1", "2", "3"), ("4", "5", "*"))
+    >>> start_grid = (("*", "2", "3"), ("1", "4", "5"))
+    >>> sol = ida_star_solve(MNPuzzle(start_grid, target_grid))
+    >>> len(path_puzzles(sol)) - 1
+    3
+    """
+    stats = _NO_STATS if stats is None else stats
+    fail_fast = stats.timed("fail_fast", _fail_fast)
+    is_solved = stats.timed("is_solved", _is_solved)
+    if not puzzle:
+        return None
+    elif fail_fast(puzzle):
+        return None
+    elif is_solved(puzzle):
+        return PuzzleNode(puzzle)
+    else:
+        bound = puzzle.heuristic()
+        while bound is not None:
+            path, bound = _bounded_search(puzzle, bound, stats)
+            if path is not None:
+                return path.node()
+        return None
+
+
+def _bounded_search(puzzle, bound, stats):
+    """
+    Return (path, None) where path is a MovePath from puzzle to a
+    solution whose steps plus heuristic never exceed bound, or
+    (None, next_bound) if there is no such path, where next_bound is the
+    smallest value that exceeded bound, or None if nothing did.
+
+    Puzzles already on the current path are skipped to avoid cycles, and
+    the move undoing the last one is never tried.
+
+    @type puzzle: Puzzle
+    @type bound: int
+    @type stats: SearchStats
+    @rtype: (MovePath | None, int | None)
+    """
+    fail_fast = stats.timed("fail_fast", _fail_fast)
+    is_solved = stats.timed("is_solved", _is_solved)
+    advance = stats.timed("extensions", next)
+    path, moves, keys = [puzzle], [], [puzzle.state_key()]
+    on_path = set(keys)
+    stats.expand(puzzle)
+    stack = [puzzle.iter_moves()]
+    next_bound = None
+    while stack:
+        pair = advance(stack[-1], None)
+        if pair is None:
+            stack.pop()
+            path.pop()
+            on_path.discard(keys.pop())
+            if moves:
+                moves.pop()
+            continue
+        move, extension = pair
+        key = extension.state_key()
+        duplicate = key in on_path
+        stats.generate(duplicate)
+        if duplicate:
+            continue
+        estimate = len(path) + extension.heuristic()
+        if estimate > bound:
+            if next_bound is None or estimate < next_bound:
+                next_bound = estimate
+        elif is_solved(extension):
+            return MovePath(puzzle, moves + [move]), None
+        elif not fail_fast(extension):
+            back = path[-1].inverse(move)
+            path.append(extension)
+            moves.append(move)
+            keys.append(key)
+            on_path.add(key)
+            stats.expand(extension)
+            stack.append(extension.iter_moves(back))
+            stats.frontier(len(stack))
+    return None, next_bound
+
+
+def bidirectional_solve(puzzle, stats=None):
+    """
+    Return a shortest path from PuzzleNode(puzzle) to a PuzzleNode
+    containing a solution, with each child PuzzleNode containing an
+    extension of the puzzle in its parent.  Return None if this is
+    not possible.
+
+    A breadth-first search from puzzle and one from puzzle.reverse() are
+    grown a layer at a time, the smaller first, until they meet.  Every
+    extension of puzzle must be undoable by an extension, as in MNPuzzle
+    and WordLadderPuzzle.  Only puzzles of the search from puzzle are
+    checked with fail_fast, since those from puzzle.reverse() aim at the
+    start, which need not be reachable the same way; a word ladder may
+    start from a word not in its dictionary.
+
+    @type puzzle: Puzzle
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"cat", "cot", "cog", "dog", "dot", "cut"}
+    >>> sol = bidirectional_solve(WordLadderPuzzle("cat", "dog", ws))
+    >>> [str(p) for p in path_puzzles(sol)]
+    ['cat -> dog', 'cot -> dog', 'dot -> dog', 'dog -> dog']
+    >>> bidirectional_solve(WordLadderPuzzle("cat", "dig", ws)) is None
+    True
+    >>> ws = {"cot", "cog", "dog", "dot"}
+    >>> sol = bidirectional_solve(WordLadderPuzzle("cat", "dog", ws))
+    >>> [p.position_key() for p in path_puzzles(sol)]
+    ['cat', 'cot', 'cog', 'dog']
+    """
+    stats = _NO_STATS if stats is None else stats
+    fail_fast = stats.timed("fail_fast", _fail_fast)
+    is_solved = stats.timed("is_solved", _is_solved)
+    if not puzzle:
+        return None
+    elif fail_fast(puzzle):
+        return None
+    elif is_solved(puzzle):
+        return PuzzleNode(puzzle)
+    else:
+        moves = stats.timed("extensions", _moves)
+        goal = puzzle.reverse()
+        tree = _SearchTree(puzzle)
+        # position key -> index in tree for the search from puzzle, and
+        # position key -> (parent's position key, depth) for the search
+        # from goal
+        forward = {puzzle.position_key(): 0}
+        backward = {goal.position_key(): (None, 0)}
+        # layers hold (puzzle, move back to its parent) pairs
+        forward_layer, backward_layer = [(puzzle, None)], [(goal, None)]
+        forward_depth = backward_depth = 0
+        while forward_layer and backward_layer:
+            # best meeting as (total steps, forward index, backward key)
+            best = None
+            if len(forward_layer) <= len(backward_layer):
+                next_layer = []
+                for current, back in forward_layer:
+                    current_index = forward[current.position_key()]
+                    if fail_fast(current):
+                        continue
+                    stats.expand(current)
+                    for move, extension in moves(current, back):
+                        key = extension.position_key()
+                        duplicate = key in forward
+                        stats.generate(duplicate)
+                        if duplicate:
+                            continue
+                        new_index = tree.add(move, current_index)
+                        forward[key] = new_index
+                        next_layer.append((extension, current.inverse(move)))
+                        if key in backward:
+                            steps = forward_depth + 1 + backward[key][1]
+                            if best is None or steps < best[0]:
+                                best = (steps, new_index, key)
+                forward_layer, forward_depth = next_layer, forward_depth + 1
+            else:
+                next_layer = []
+                for current, back in backward_layer:
+                    current_key = current.position_key()
+                    stats.expand(current)
+                    for move, extension in moves(current, back):
+                        key = extension.position_key()
+                        duplicate = key in backward
+                        stats.generate(duplicate)
+                        if duplicate:
+                            continue
+                        backward[key] = (current_key, backward_depth + 1)
+                        next_layer.append((extension, current.inverse(move)))
+                        if key in forward:
+                            steps = (backward_depth + 1 +
+                                     tree.depth(forward[key]))
+                            if best is None or steps < best[0]:
+                                best = (steps, forward[key], key)
+                backward_layer = next_layer
+                backward_depth += 1
+            stats.frontier(len(forward_layer) + len(backward_layer))
+            if best is not None:
+                return _join_halves(tree, best[1], best[2], backward)
+        return None
+
+
+def _join_halves(tree, index, key, backward):
+    """
+    Extend the forward path ending at the puzzle at index in tree, which
+    has position key, along the parent keys recorded in backward, and
+    return the root of the whole path.
+
+    Each step is replayed by picking the move to the extension with the
+    next key, so the path holds puzzles working towards the original
+    goal.
+
+    @type tree: _SearchTree
+    @type index: int
+    @type key: Hashable
+    @type backward: dict[Hashable, (Hashable, int)]
+    @rtype: PuzzleNode
+    """
+    path = tree.move_path(index)
+    *_, puzzle = path.puzzles()
+    key = backward[key][0]
+    while key is not None:
+        move, puzzle = [(move, extension)
+                        for move, extension in puzzle.iter_moves()
+                        if extension.position_key() == key][0]
+        path.moves.append(move)
+        key = backward[key][0]
+    return path.node()
+
+
+def parallel_solve(puzzle, solver=depth_first_solve, frontier_depth=1,
+                   max_workers=None, stats=None):
+    """
+    Return a path from PuzzleNode(puzzle) to a PuzzleNode containing
+    a solution, with each child PuzzleNode containing an extension
+    of the puzzle in its parent.  Return None if this is not possible.
+
+    The extensions of puzzle are expanded breadth-first frontier_depth
+    levels deep, and solver is run on each puzzle of that frontier in a
+    pool of max_workers processes (one per CPU by default).  The first
+    solution found stops the remaining workers.  solver and the puzzles
+    must be picklable, so solver should be a module-level function, and
+    it must accept a stats argument, through which a worker is told to
+    stop.
+
+    If stats is given, the counters and timers of workers that finish
+    are added to it, but its callback is only called in this process.
+
+    @type puzzle: Puzzle
+    @type solver: (Puzzle, SearchStats) -> PuzzleNode | None
+    @type frontier_depth: int
+    @type max_workers: int | None
+    @type stats: SearchStats | None
+    @rtype: PuzzleNode
+
+    >>> from sudoku_puzzle import SudokuPuzzle
+    >>> grid = ["*", "B", "C", "*", "C", "*", "*", "B"]
+    >>> grid += ["B", "*", "*", "C", "*", "C", "B", "*"]
+    >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+    >>> sol = parallel_solve(s, max_workers=2)
+    >>> path_puzzles(sol)[-1].is_solved()
+    True
+    >>> path_puzzles(sol)[0] == s
+    True
+    """
+    stats = _NO_STATS if stats is None else stats
+    fail_fast = stats.timed("fail_fast", _fail_fast)
+    is_solved = stats.timed("is_solved", _is_solved)
+    if not puzzle:
+        return None
+    elif fail_fast(puzzle):
+        return None
+    elif is_solved(puzzle):
+        return PuzzleNode(puzzle)
+    else:
+        moves = stats.timed("extensions", _moves)
+        tree = _SearchTree(puzzle)
+        # (index in tree, puzzle, move back to its parent) pairs
+        frontier = [(0, puzzle, None)]
+        past_puzzle = {puzzle.state_key()}
+        for _ in range(frontier_depth):
+            next_frontier = []
+            for current_index, current_puzzle, back in frontier:
+                stats.expand(current_puzzle)
+                for move, extension in moves(current_puzzle, back):
+                    key = extension.state_key()
+                    duplicate = key in past_puzzle
+                    stats.generate(duplicate)
+                    if not duplicate:
+                        past_puzzle.add(key)
+                        new_index = tree.add(move, current_index)
+                        if is_solved(extension):
+                            return tree.path(new_index)
+                        if not fail_fast(extension):
+                            next_frontier.append(
+                                (new_index, extension,
+                                 current_puzzle.inverse(move)))
+            frontier = next_frontier
+            stats.frontier(len(frontier))
+        if not frontier:
             return None
-        else:
-            while current_puzzle.parent is not None:
-                current_puzzle.parent.children = [current_puzzle]
-                current_puzzle = current_puzzle.parent
-            return current_puzzle
+        record = stats is not _NO_STATS
+        tasks = ((index, (solver, subtree, record))
+                 for index, subtree, _ in frontier)
+        with closing(pool_map(_solve_subtree, tasks, max_workers)) as results:
+            for index, (subtree_path, subtree_stats) in results:
+                if subtree_stats is not None:
+                    stats.merge(subtree_stats)
+                if subtree_path is not None:
+                    prefix = list(tree.move_path(index).puzzles())
+                    return _nodes_from_path(prefix[:-1] + subtree_path)
+        return None
+
+
+def pool_map(function, tasks, max_workers=None):
+    """
+    Yield (tag, function(*args)) for each (tag, args) in the iterable
+    tasks, in the order the calls finish, running them in a pool of
+    max_workers processes (one per CPU by default).
+
+    At most two calls per worker are submitted at a time, more being
+    submitted as they finish.  When the caller stops early, by closing
+    this generator, the workers are told to stop through stop_requested,
+    calls not yet started are cancelled and the pool is shut down once
+    the running calls return.  function must be picklable, so it should
+    be a module-level function.
+
+    @type function: Callable
+    @type tasks: Iterable[(Hashable, tuple)]
+    @type max_workers: int | None
+    @rtype: Iterator[(Hashable, Any)]
+
+    >>> sorted(pool_map(pow, [(n, (n, 2)) for n in range(5)], 2))
+    [(0, 0), (1, 1), (2, 4), (3, 9), (4, 16)]
+    """
+    workers = (os.cpu_count() or 1) if max_workers is None else max_workers
+    tasks, stop = iter(tasks), Event()
+    executor = ProcessPoolExecutor(workers, initializer=_set_stop_event,
+                                   initargs=(stop,))
+    try:
+        pending = {}
+        for tag, args in islice(tasks, 2 * workers):
+            pending[executor.submit(function, *args)] = tag
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                tag = pending.pop(future)
+                for more_tag, args in islice(tasks, 1):
+                    pending[executor.submit(function, *args)] = more_tag
+                yield tag, future.result()
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _solve_subtree(solver, puzzle, record):
+    """
+    Return (path, stats) where path is the list of puzzles on the path
+    solver finds from puzzle, or None if it finds none, and stats is
+    SearchStats.as_dict() for the search if record is True, or None.
+
+    A list is returned rather than a PuzzleNode since it is cheaper to
+    send back from a worker process.  The search gives up, finding no
+    path, once stop_requested.
+
+    @type solver: (Puzzle, SearchStats) -> PuzzleNode | None
+    @type puzzle: Puzzle
+    @type record: bool
+    @rtype: (list[Puzzle] | None, dict | None)
+    """
+    stats = SearchStats(_check_stop) if record else _StopCheck()
+    try:
+        solution = solver(puzzle, stats=stats)
+    except _Stopped:
+        solution = None
+    stats = stats.as_dict() if record else None
+    if solution is None:
+        return None, stats
+    return path_puzzles(solution), stats
+
+
+def _nodes_from_path(path):
+    """
+    Return the root of a chain of PuzzleNodes holding the puzzles in path,
+    each the only child of the one before.
+
+    @type path: list[Puzzle]
+    @rtype: PuzzleNode
+    """
+    node = None
+    for puzzle in path:
+        node = PuzzleNode(puzzle, [], node)
+    return _trace_path(node)
+
+
+def _trace_path(node):
+    """
+    Link each PuzzleNode from node back to the root to its child on the
+    path, and return the root.
+
+    @type node: PuzzleNode
+    @rtype: PuzzleNode
+    """
+    while node.parent is not None:
+        node.parent.children = [node]
+        node = node.parent
+    return node
+
+
+def path_puzzles(node):
+    """
+    Return the list of puzzles on the path starting at PuzzleNode node,
+    following the first child at each step.
+
+    @type node: PuzzleNode | None
+    @rtype: list[Puzzle]
+
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> root = PuzzleNode(WordLadderPuzzle("on", "no", {"on", "no"}))
+    >>> [str(p) for p in path_puzzles(root)]
+    ['on -> no']
+    """
+    result = []
+    while node is not None:
+        result.append(node.puzzle)
+        node = node.children[0] if node.children else None
+    return result
+
+
+class SearchStats:
+    """
+    Counters and timers recorded by a solver during one or more searches.
+
+    === Attributes ===
+    @type expanded: int
+        number of puzzles whose extensions were asked for
+    @type generated: int
+        number of extensions produced, including duplicates
+    @type duplicates: int
+        number of extensions skipped as already seen
+    @type peak_frontier: int
+        largest number of puzzles waiting to be expanded at once
+    @type seconds: dict[str, float]
+        seconds spent in each of extensions, fail_fast and is_solved
+    @type callback: (Puzzle, SearchStats) -> Any | None
+        called with each puzzle as it is expanded, if not None
+    """
+
+    def __init__(self, callback=None):
+        """
+        Create a new SearchStats self with all counts at zero.
+
+        @type self: SearchStats
+        @type callback: (Puzzle, SearchStats) -> Any | None
+        @rtype: None
+
+        >>> SearchStats().expanded
+        0
+        """
+        self.expanded, self.generated, self.duplicates = 0, 0, 0
+        self.peak_frontier = 0
+        self.seconds = {"extensions": 0.0, "fail_fast": 0.0,
+                        "is_solved": 0.0}
+        self.callback = callback
+
+    def __str__(self):
+        """
+        Return a human-readable summary of SearchStats self.
+
+        >>> print(SearchStats())
+        expanded 0, generated 0, duplicates 0, peak frontier 0
+        extensions 0.000s, fail_fast 0.000s, is_solved 0.000s
+        """
+        return ("expanded {}, generated {}, duplicates {}, "
+                "peak frontier {}\n"
+                "extensions {:.3f}s, fail_fast {:.3f}s, "
+                "is_solved {:.3f}s").format(
+            self.expanded, self.generated, self.duplicates,
+            self.peak_frontier, self.seconds["extensions"],
+            self.seconds["fail_fast"], self.seconds["is_solved"])
+
+    def as_dict(self):
+        """
+        Return the counters and timers of SearchStats self as a dict.
+
+        @type self: SearchStats
+        @rtype: dict
+
+        >>> sorted(SearchStats().as_dict())
+        ['duplicates', 'expanded', 'generated', 'peak_frontier', 'seconds']
+        """
+        return {"expanded": self.expanded, "generated": self.generated,
+                "duplicates": self.duplicates,
+                "peak_frontier": self.peak_frontier,
+                "seconds": dict(self.seconds)}
+
+    def merge(self, other):
+        """
+        Add the counters and timers in other, a result of as_dict(), to
+        SearchStats self.  The peak frontier is the larger of the two.
+
+        @type self: SearchStats
+        @type other: dict
+        @rtype: None
+
+        >>> stats = SearchStats()
+        >>> stats.merge({"expanded": 2, "generated": 5, "duplicates": 1,
+        ...              "peak_frontier": 3, "seconds": {"is_solved": 1.0}})
+        >>> stats.generated, stats.seconds["is_solved"]
+        (5, 1.0)
+        """
+        self.expanded += other["expanded"]
+        self.generated += other["generated"]
+        self.duplicates += other["duplicates"]
+        self.peak_frontier = max(self.peak_frontier, other["peak_frontier"])
+        for name in other["seconds"]:
+            self.seconds[name] = (self.seconds.get(name, 0.0) +
+                                  other["seconds"][name])
+
+    def expand(self, puzzle):
+        """
+        Record that the extensions of puzzle are being asked for.
+
+        @type self: SearchStats
+        @type puzzle: Puzzle
+        @rtype: None
+        """
+        self.expanded += 1
+        if self.callback is not None:
+            self.callback(puzzle, self)
+
+    def generate(self, duplicate):
+        """
+        Record that an extension was produced, and whether it was a
+        duplicate of one already seen.
+
+        @type self: SearchStats
+        @type duplicate: bool
+        @rtype: None
+        """
+        self.generated += 1
+        if duplicate:
+            self.duplicates += 1
+
+    def frontier(self, size):
+        """
+        Record that size puzzles are waiting to be expanded.
+
+        @type self: SearchStats
+        @type size: int
+        @rtype: None
+        """
+        if size > self.peak_frontier:
+            self.peak_frontier = size
+
+    def timed(self, name, function):
+        """
+        Return a function that calls function and adds the time it took
+        to self.seconds[name].
+
+        @type self: SearchStats
+        @type name: str
+        @type function: Callable
+        @rtype: Callable
+        """
+        seconds = self.seconds
+
+        def timed_function(*args):
+            start = perf_counter()
+            try:
+                return function(*args)
+            finally:
+                seconds[name] += perf_counter() - start
+        return timed_function
+
+
+class _NoStats(SearchStats):
+    """
+    A SearchStats that records nothing, used by solvers that were not
+    given one so they can skip their bookkeeping cheaply.
+    """
+
+    def expand(self, puzzle):
+        pass
+
+    def generate(self, duplicate):
+        pass
+
+    def frontier(self, size):
+        pass
+
+    def timed(self, name, function):
+        return function
+
+
+_NO_STATS = _NoStats()
+_fail_fast = methodcaller("fail_fast")
+_is_solved = methodcaller("is_solved")
+
+
+def _moves(puzzle, skip):
+    """
+    Return the list of puzzle.iter_moves(skip), so that building every
+    extension of puzzle can be timed as one call.
+
+    @type puzzle: Puzzle
+    @type skip: Hashable | None
+    @rtype: list[(Hashable, Puzzle)]
+    """
+    return list(puzzle.iter_moves(skip))
+
+
+# set in each worker process of pool_map to the event telling it to stop
+_stop_event = None
+
+
+def _set_stop_event(event):
+    """
+    Record event as the stop event of this worker process.
+
+    @type event: multiprocessing.Event
+    @rtype: None
+    """
+    global _stop_event
+    _stop_event = event
+
+
+def stop_requested():
+    """
+    Return whether this process is a pool_map worker that has been told
+    to stop, so long-running work should give up.
+
+    @rtype: bool
+
+    >>> stop_requested()
+    False
+    """
+    return _stop_event is not None and _stop_event.is_set()
+
+
+class _Stopped(Exception):
+    """
+    Raised inside a search in a worker process once stop_requested.
+    """
+
+
+def _check_stop(puzzle, stats):
+    """
+    Raise _Stopped if stop_requested, checking every 256 expansions
+    recorded in stats; used as the callback of worker searches.
+
+    @type puzzle: Puzzle
+    @type stats: SearchStats
+    @rtype: None
+    """
+    if stats.expanded % 256 == 0 and stop_requested():
+        raise _Stopped()
+
+
+class _StopCheck(_NoStats):
+    """
+    A SearchStats that records nothing but the number of expansions, and
+    checks for a stop request as they happen.
+    """
+
+    def __init__(self):
+        """
+        Create a new _StopCheck self.
+
+        @type self: _StopCheck
+        @rtype: None
+        """
+        super().__init__()
+
+    def expand(self, puzzle):
+        self.expanded += 1
+        _check_stop(puzzle, self)
+
+
+class _SearchTree:
+    """
+    The puzzles generated by a search, stored as the root puzzle and
+    parallel lists of moves and parent indices, so that only the root is
+    kept and no PuzzleNode is built until a path is asked for.
+
+    === Attributes ===
+    @type root: Puzzle
+        the puzzle at index 0
+    @type moves: list[Hashable]
+        the move making each puzzle from its parent; None for the root
+    @type parents: list[int]
+        index of each puzzle's parent, or -1 for the root
+    """
+
+    def __init__(self, root):
+        """
+        Create a new _SearchTree self holding just root.
+
+        @type self: _SearchTree
+        @type root: Puzzle
+        @rtype: None
+        """
+        self.root, self.moves, self.parents = root, [None], [-1]
+
+    def add(self, move, parent):
+        """
+        Add the puzzle made by move from the puzzle at index parent to
+        _SearchTree self, and return its index.
+
+        @type self: _SearchTree
+        @type move: Hashable
+        @type parent: int
+        @rtype: int
+        """
+        self.moves.append(move)
+        self.parents.append(parent)
+        return len(self.moves) - 1
+
+    def depth(self, index):
+        """
+        Return the number of ancestors of the puzzle at index.
+
+        @type self: _SearchTree
+        @type index: int
+        @rtype: int
+        """
+        depth = 0
+        while self.parents[index] != -1:
+            index, depth = self.parents[index], depth + 1
+        return depth
+
+    def move_path(self, index):
+        """
+        Return the MovePath from the root of _SearchTree self to the
+        puzzle at index.
+
+        @type self: _SearchTree
+        @type index: int
+        @rtype: MovePath
+        """
+        moves = []
+        while index > 0:
+            moves.append(self.moves[index])
+            index = self.parents[index]
+        moves.reverse()
+        return MovePath(self.root, moves)
+
+    def path(self, index):
+        """
+        Return the root of a chain of PuzzleNodes from the root of
+        _SearchTree self down to the puzzle at index.
+
+        @type self: _SearchTree
+        @type index: int
+        @rtype: PuzzleNode
+
+        >>> from word_ladder_puzzle import WordLadderPuzzle
+        >>> ws = {"on", "nn", "no"}
+        >>> tree = _SearchTree(WordLadderPuzzle("on", "no", ws))
+        >>> leaf = tree.add((0, "n"), 0)
+        >>> leaf = tree.add((1, "o"), leaf)
+        >>> [str(p) for p in path_puzzles(tree.path(leaf))]
+        ['on -> no', 'nn -> no', 'no -> no']
+        """
+        return self.move_path(index).node()
+
+
+class MovePath:
+    """
+    A path of puzzles kept as its first puzzle and the moves made from
+    it, so that the puzzles along it are only built when asked for.
+
+    === Attributes ===
+    @type start: Puzzle
+        the first puzzle of the path
+    @type moves: list[Hashable]
+        the moves made in turn from start, as given by iter_moves
+    """
+    __slots__ = ("start", "moves")
+
+    def __init__(self, start, moves):
+        """
+        Create a new MovePath self from start along moves.
+
+        @type self: MovePath
+        @type start: Puzzle
+        @type moves: list[Hashable]
+        @rtype: None
+        """
+        self.start, self.moves = start, moves
+
+    def __len__(self):
+        """
+        Return the number of moves of MovePath self.
+
+        @type self: MovePath
+        @rtype: int
+        """
+        return len(self.moves)
+
+    def puzzles(self):
+        """
+        Yield the puzzles along MovePath self, from start on, replaying
+        each move only when the next puzzle is asked for.
+
+        @type self: MovePath
+        @rtype: Iterator[Puzzle]
+
+        >>> from mn_puzzle import MNPuzzle
+        >>> start = MNPuzzle((("*", "1"),), (("1", "*"),))
+        >>> [str(p) for p in MovePath(start, ["R", "L"]).puzzles()]
+        ['*1', '1*', '*1']
+        """
+        puzzle = self.start
+        yield puzzle
+        for move in self.moves:
+            puzzle = puzzle.apply(move)
+            yield puzzle
+
+    def node(self):
+        """
+        Return the root of a chain of PuzzleNodes holding the puzzles
+        along MovePath self.
+
+        @type self: MovePath
+        @rtype: PuzzleNode
+        """
+        return _nodes_from_path(list(self.puzzles()))
 
 
 # Class PuzzleNode helps build trees of PuzzleNodes that have
@@ -128,6 +1059,7 @@ class PuzzleNode:
     A Puzzle configuration that refers to other configurations that it
     can be extended to.
     """
+    __slots__ = ("puzzle", "children", "parent")
 
     def __init__(self, puzzle=None, children=None, parent=None):
         """
@@ -161,17 +1093,145 @@ class PuzzleNode:
         True
         >>> pn1.__eq__(pn3)
         False
+        >>> pn1.children.append(pn3)
+        >>> pn1.__eq__(pn2)
+        False
+        >>> pn2.children.append(pn3)
+        >>> pn1.__eq__(pn2)
+        True
         """
-        return (type(self) == type(other) and
-                self.puzzle == other.puzzle and
-                all([x in self.children for x in other.children]) and
-                all([x in other.children for x in self.children]))
+        if type(self) != type(other):
+            return False
+        # both trees share one table of subtree signatures, so equal
+        # subtrees get the same number
+        signatures = {}
+        return (_subtree_signature(self, signatures) ==
+                _subtree_signature(other, signatures))
 
     def __str__(self):
         """
         Return a human-readable string representing PuzzleNode self.
 
-        # doctest not feasible.
+        >>> from word_ladder_puzzle import WordLadderPuzzle
+        >>> ws = {"on", "no", "oo"}
+        >>> root = PuzzleNode(WordLadderPuzzle("on", "no", ws))
+        >>> root.children.append(PuzzleNode(WordLadderPuzzle("oo", "no", ws)))
+        >>> root.children.append(PuzzleNode(WordLadderPuzzle("no", "no", ws)))
+        >>> print(root)
+        on -> no
+        <BLANKLINE>
+        oo -> no
+        <BLANKLINE>
+        <BLANKLINE>
+        no -> no
+        <BLANKLINE>
+        <BLANKLINE>
         """
-        return "{}\n\n{}".format(self.puzzle,
-                                 "\n".join([str(x) for x in self.children]))
\ No newline at end of file
+        return "".join(_render_pieces(self))
+
+
+def _render_pieces(node):
+    """
+    Yield the pieces of str(node) in order, walking the tree below
+    PuzzleNode node with an explicit stack rather than recursion.
+
+    Each node gives its puzzle and a blank line, followed by its children
+    separated by newlines.
+
+    @type node: PuzzleNode
+    @rtype: Iterator[str]
+    """
+    # entries are PuzzleNodes still to render or strings to emit as-is
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            yield item
+        else:
+            yield "{}\n\n".format(item.puzzle)
+            for i in range(len(item.children) - 1, -1, -1):
+                stack.append(item.children[i])
+                if i > 0:
+                    stack.append("\n")
+
+
+def _subtree_signature(node, signatures):
+    """
+    Return a number identifying the tree below PuzzleNode node, such that
+    two trees get the same number exactly when they have equal puzzles and
+    the same set of child trees.  signatures maps each (puzzle, frozenset
+    of child numbers) seen so far to its number, and is extended.
+
+    The tree is walked in post-order with an explicit stack.
+
+    @type node: PuzzleNode
+    @type signatures: dict[(Puzzle, frozenset[int]), int]
+    @rtype: int
+    """
+    numbers = {}
+    stack = [(node, False)]
+    while stack:
+        current, children_done = stack.pop()
+        if children_done:
+            signature = (current.puzzle,
+                         frozenset([numbers[id(x)] for x in current.children]))
+            numbers[id(current)] = signatures.setdefault(signature,
+                                                         len(signatures))
+        else:
+            stack.append((current, True))
+            for x in current.children:
+                stack.append((x, False))
+    return numbers[id(node)]
+
+
+def write_path(node, out):
+    """
+    Write str(node) to the file object out a piece at a time, without
+    building the whole string in memory.
+
+    @type node: PuzzleNode
+    @type out: io.TextIOBase
+    @rtype: None
+
+    >>> import io
+    >>> from word_ladder_puzzle import WordLadderPuzzle
+    >>> ws = {"on", "no", "oo"}
+    >>> sol = breadth_first_solve(WordLadderPuzzle("on", "no", ws))
+    >>> out = io.StringIO()
+    >>> write_path(sol, out)
+    >>> out.getvalue() == str(sol)
+    True
+    """
+    for piece in _render_pieces(node):
+        out.write(piece)
+
+
+def write_atomically(path, chunks):
+    """
+    Write the bytes in chunks to the file at path, replacing it whole.
+
+    The chunks go to a temporary file of its own in the same directory
+    first, so a reader never sees half a file and processes writing the
+    same path at once do not mix their writes.
+
+    @type path: str
+    @type chunks: Iterable[bytes]
+    @rtype: None
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "out")
+    >>> write_atomically(path, [b"ab", b"c"])
+    >>> open(path, "rb").read()
+    b'abc'
+    >>> os.listdir(os.path.dirname(path))
+    ['out']
+    """
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path) or ".")
+    try:
+        with os.fdopen(handle, "wb") as out:
+            for chunk in chunks:
+                out.write(chunk)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+Solve many sudokus from a file or stdin, one puzzle per line
+
+Each line holds the n ** 2 symbols of an nxn sudoku row by row, as in
+the common 81 character format for 9x9 puzzles, with ".", "0" or "*"
+for an empty position.  Solutions are written one per line in input
+order, with "unsolvable" for a puzzle with no solution and "invalid" for
+a line that is not a sudoku, and puzzles/second and latency percentiles
+go to stderr.
+
+Run "python sudoku_batch.py --help" for the command line options.
+"""
+import argparse
+import os
+import sys
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from time import perf_counter
+from sudoku_puzzle import SudokuPuzzle
+
+# symbols of an nxn sudoku are the first n of these
+SYMBOLS = "123456789ABCDEFGHIJKLMNOP"
+# characters marking an empty position
+BLANKS = ".0*"
+# solve_line's result for a line that is not a sudoku
+INVALID = "invalid"
+
+
+def parse_sudoku(line):
+    """
+    Return the SudokuPuzzle written on line, or raise ValueError if
+    line is not a sudoku.
+
+    @type line: str
+    @rtype: SudokuPuzzle
+
+    >>> s = parse_sudoku("1.3." + "3*1*" + "2010" + "4000")
+    >>> s._symbols[:4]
+    ['1', '*', '3', '*']
+    >>> parse_sudoku("123")
+    Traceback (most recent call last):
+    ...
+    ValueError: not a sudoku: '123'
+    """
+    line = line.strip()
+    n = round(len(line) ** (1 / 2))
+    root = round(n ** (1 / 2))
+    if (n == 0 or n * n != len(line) or root * root != n or
+            n > len(SYMBOLS) or
+            not all([c in BLANKS or c in SYMBOLS[:n] for c in line])):
+        raise ValueError("not a sudoku: {!r}".format(line))
+    symbols = ["*" if c in BLANKS else c for c in line]
+    return SudokuPuzzle(n, symbols, set(SYMBOLS[:n]))
+
+
+def format_sudoku(puzzle):
+    """
+    Return SudokuPuzzle puzzle as a line, with "." for empty positions.
+
+    @type puzzle: SudokuPuzzle
+    @rtype: str
+
+    >>> format_sudoku(parse_sudoku("1*3*" + "3*1*" + "2010" + "4000"))
+    '1.3.3.1.2.1.4...'
+    """
+    return "".join(puzzle._symbols).replace("*", ".")
+
+
+def solve_line(line, mode="dlx"):
+    """
+    Return (solution, seconds) for the sudoku on line, where solution is
+    the solved grid as a line, None if there is no solution, or INVALID
+    if line is not a sudoku, and seconds is the time taken to parse and
+    solve it.
+
+    @type line: str
+    @type mode: str
+    @rtype: (str | None, float)
+
+    >>> solve_line("...." + "..4." + ".2.." + "....")[0]
+    '4312214312343421'
+    >>> solve_line("123")[0]
+    'invalid'
+    """
+    start = perf_counter()
+    try:
+        puzzle = parse_sudoku(line)
+    except ValueError:
+        return INVALID, perf_counter() - start
+    solution = puzzle.solve(mode, path=False)
+    return (format_sudoku(solution) if solution is not None else None,
+            perf_counter() - start)
+
+
+def _solve_chunk(lines, mode):
+    """
+    Return the list of solve_line results for lines, in order; this is
+    the unit of work sent to a worker process.
+
+    @type lines: list[str]
+    @type mode: str
+    @rtype: list[(str | None, float)]
+    """
+    return [solve_line(line, mode) for line in lines]
+
+
+def solve_stream(lines, mode="dlx", max_workers=None, chunk_size=64):
+    """
+    Yield (line, solution, seconds) for each sudoku in the iterable
+    lines, in input order, as solve_line would; blank lines are skipped.
+
+    lines are read chunk_size at a time and each chunk is solved in a
+    pool of max_workers processes (one per CPU by default), or in this
+    process if max_workers is 0.  At most two chunks per worker are read
+    ahead of the one being yielded, so memory stays bounded however long
+    lines is.
+
+    @type lines: Iterable[str]
+    @type mode: str
+    @type max_workers: int | None
+    @type chunk_size: int
+    @rtype: Iterator[(str, str | None, float)]
+
+    >>> puzzles = ["1.3.3.1.2.1.4...", "", "11..............", "123",
+    ...            "......4..2......"]
+    >>> for line, solution, seconds in solve_stream(puzzles, max_workers=0):
+    ...     print(line, solution)
+    1.3.3.1.2.1.4... None
+    11.............. None
+    123 invalid
+    ......4..2...... 4312214312343421
+    >>> [r[1] for r in solve_stream(puzzles, max_workers=2, chunk_size=1)]
+    [None, None, 'invalid', '4312214312343421']
+    """
+    lines = (line.strip() for line in lines if line.strip())
+    chunks = iter(lambda: list(islice(lines, chunk_size)), [])
+    if max_workers == 0:
+        for chunk in chunks:
+            for line, result in zip(chunk, _solve_chunk(chunk, mode)):
+                yield (line,) + result
+        return
+    workers = (os.cpu_count() or 1) if max_workers is None else max_workers
+    with ProcessPoolExecutor(workers) as executor:
+        window = 2 * workers
+        pending = deque()
+        for chunk in islice(chunks, window):
+            pending.append((chunk, executor.submit(_solve_chunk, chunk,
+                                                   mode)))
+        while pending:
+            chunk, future = pending.popleft()
+            for more in islice(chunks, 1):
+                pending.append((more, executor.submit(_solve_chunk,
+                                                      more, mode)))
+            for line, result in zip(chunk, future.result()):
+                yield (line,) + result
+
+
+def percentile(ordered, fraction):
+    """
+    Return the value at fraction of the way through the sorted list
+    ordered, by the nearest-rank method.
+
+    @type ordered: list[float]
+    @type fraction: float
+    @rtype: float
+
+    >>> percentile([1, 2, 3, 4], 0.5), percentile([1, 2, 3, 4], 0.99)
+    (2, 4)
+    """
+    rank = max(1, -(-len(ordered) * fraction // 1))
+    return ordered[int(rank) - 1]
+
+
+def summary(latencies, seconds):
+    """
+    Return lines reporting puzzles/second and latency percentiles for
+    latencies, the per-puzzle solving times of a run taking seconds.
+
+    @type latencies: Sequence[float]
+    @type seconds: float
+    @rtype: str
+
+    >>> print(summary([0.001, 0.002, 0.003, 0.004], 0.5))
+    4 puzzles in 0.500s, 8.0 puzzles/s
+    latency p50 2.00ms, p90 4.00ms, p99 4.00ms, max 4.00ms
+    """
+    if not latencies:
+        return "0 puzzles in {:.3f}s".format(seconds)
+    ordered = sorted(latencies)
+    return ("{} puzzles in {:.3f}s, {:.1f} puzzles/s\n"
+            "latency p50 {:.2f}ms, p90 {:.2f}ms, p99 {:.2f}ms, "
+            "max {:.2f}ms".format(
+                len(ordered), seconds,
+                len(ordered) / seconds if seconds > 0 else float("inf"),
+                1000 * percentile(ordered, 0.5),
+                1000 * percentile(ordered, 0.9),
+                1000 * percentile(ordered, 0.99), 1000 * ordered[-1]))
+
+
+def main(argv=None):
+    """
+    Solve the sudokus named by the command line arguments argv (the
+    process arguments by default) and return the exit status: 1 if some
+    puzzle had no solution or some line was not a sudoku, 0 otherwise.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description="Solve sudokus, one per line.")
+    parser.add_argument("file", nargs="?", default="-",
+                        help="file of puzzles (default: stdin)")
+    parser.add_argument("--mode", choices=["dlx", "backtrack", "search"],
+                        default="dlx",
+                        help="SudokuPuzzle.solve mode")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes, 0 to solve in this "
+                             "process (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=64,
+                        help="puzzles sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.file == "-" else open(args.file, "r")
+    # 8 bytes per puzzle, so millions of puzzles still fit
+    latencies, failed = array("d"), 0
+    start = perf_counter()
+    try:
+        for line, solution, seconds in solve_stream(
+                source, args.mode, args.workers, args.chunk_size):
+            latencies.append(seconds)
+            if solution is None or solution == INVALID:
+                failed += 1
+            print(solution if solution is not None else "unsolvable")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(summary(latencies, perf_counter() - start), file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,9 @@
 from puzzle import Puzzle
+from contextlib import closing
+from itertools import islice
+from puzzle_tools import (PuzzleNode, depth_first_solve, pool_map,
+                          stop_requested)
+from exact_cover import DancingLinks
 
 
 class SudokuPuzzle(Puzzle):
@@ -6,22 +11,52 @@ class SudokuPuzzle(Puzzle):
     A sudoku puzzle that may be solved, unsolved, or even unsolvable.
     """
 
-    def __init__(self, n, symbols, symbol_set):
+    def __init__(self, n, symbols, symbol_set, branching="mrv",
+                 ordering="lcv", propagate=True):
         """
         Create a new nxn SudokuPuzzle self with symbols
         from symbol_set already selected.
 
+        branching chooses the position extensions fill: "first" for the
+        first empty position, or "mrv" for the one with fewest allowed
+        symbols, ties going to the one with most empty positions in its
+        row, column and subsquare.  ordering chooses the order of the
+        extensions: "natural" for sorted symbol order, or "lcv" to try
+        first the symbols that rule out fewest choices elsewhere.
+
+        If propagate is True, each extension also fills in every position
+        forced by naked or hidden singles, and drops candidates ruled out
+        by naked or hidden pairs, until nothing changes.  An extension
+        where this reaches a contradiction fails fast.
+
         @type self: SudokuPuzzle
         @type n: int
         @type symbols: list[str]
         @type symbol_set: set[str]
+        @type branching: str
+        @type ordering: str
+        @type propagate: bool
         """
         assert n > 0
         assert round(n ** (1 / 2)) * round(n ** (1 / 2)) == n
         assert all([d in (symbol_set | {"*"}) for d in symbols])
         assert len(symbol_set) == n
         assert len(symbols) == n ** 2
+        assert branching in ("first", "mrv") and ordering in ("natural", "lcv")
         self._n, self._symbols, self._symbol_set = n, symbols, symbol_set
+        self._branching, self._ordering = branching, ordering
+        self._propagate = propagate
+        # each symbol gets one bit, so the symbols used in a row, column
+        # or subsquare can be kept as an int bitmask
+        self._symbol_order, self._bits = _symbol_bits(symbol_set)
+        self._rows, self._columns, self._boxes = self._used_masks()
+        # bitmask of the symbols still possible at each position, 0 for
+        # positions already filled
+        self._candidates = [self._unused(m) if symbols[m] == "*" else 0
+                            for m in range(n ** 2)]
+        self._contradiction = False
+        # position filled last by an extension, None for a new puzzle
+        self._last = None
 
     def __eq__(self, other):
         """
@@ -55,6 +90,29 @@ class SudokuPuzzle(Puzzle):
                 self._n == other._n and self._symbols == other._symbols and
                 self._symbol_set == other._symbol_set)
 
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return a hashable key identifying the configuration of
+        SudokuPuzzle self.
+
+        @type self: SudokuPuzzle
+        @rtype: tuple
+
+        >>> grid = ["A", "B", "C", "D"]
+        >>> grid += ["D", "C", "B", "A"]
+        >>> grid += ["*", "D", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> s1 = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> s2 = SudokuPuzzle(4, grid[:], {"A", "B", "C", "D"})
+        >>> s1.state_key() == s2.state_key()
+        True
+        >>> len({s1, s2})
+        1
+        """
+        return (self._n, tuple(self._symbols), self._symbol_order)
+
     def __str__(self):
         """
         Return a human-readable string representation of SudokuPuzzle self.
@@ -131,13 +189,12 @@ class SudokuPuzzle(Puzzle):
         False
         """
         # convenient names
-        n, symbols = self._n, self._symbols
-        # no "*" left and all rows, column, subsquares have correct symbols
-        return ("*" not in symbols and
-                all([(self._row_set(i) == self._symbol_set and
-                      self._column_set(i) == self._symbol_set and
-                      self._subsquare_set(i) ==
-                      self._symbol_set) for i in range(n ** 2)]))
+        full = (1 << self._n) - 1
+        # no "*" left and all rows, column, subsquares have correct symbols;
+        # with no "*" a full mask means no symbol is repeated
+        return ("*" not in self._symbols and
+                all([mask == full for mask in
+                     self._rows + self._columns + self._boxes]))
     
 
     def extensions(self):
@@ -162,27 +219,77 @@ class SudokuPuzzle(Puzzle):
         >>> all([s in L1 for s in L2])
         True
         """
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the extensions of SudokuPuzzle self one at a time, building
+        each only when it is asked for.
+
+        @type self: SudokuPuzzle
+        @rtype: Iterator[SudokuPuzzle]
+
+        >>> grid = ["A", "B", "C", "D"]
+        >>> grid += ["C", "D", "A", "B"]
+        >>> grid += ["B", "A", "D", "C"]
+        >>> grid += ["D", "C", "B", "*"]
+        >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> print(next(s.iter_extensions())._symbols[-1])
+        A
+        """
+        for _, extension in self.iter_moves():
+            yield extension
+
+    def iter_moves(self, skip=None):
+        """
+        Yield (move, extension) for each extension of SudokuPuzzle self,
+        where move is (position, symbol): the symbol put at that
+        position, before any propagation.  Move skip is left out.
+
+        @type self: SudokuPuzzle
+        @type skip: (int, str) | None
+        @rtype: Iterator[((int, str), SudokuPuzzle)]
+
+        >>> grid = ["A", "B", "C", "D"]
+        >>> grid += ["C", "D", "A", "B"]
+        >>> grid += ["B", "A", "D", "C"]
+        >>> grid += ["D", "C", "B", "*"]
+        >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> [move for move, _ in s.iter_moves()]
+        [(15, 'A')]
+        """
         # convenient names
-        symbols, symbol_set, n = self._symbols, self._symbol_set, self._n
-        if "*" not in symbols:
-            # return an empty list
-            return [_ for _ in []]
-        else:
-            # position of first empty position
-            i = symbols.index("*")
-            # allowed symbols at position i
-            # A | B == A.union(B)
-            allowed_symbols = (self._symbol_set -
-                               (self._row_set(i) |
-                                self._column_set(i) |
-                                self._subsquare_set(i)))
-            # list of SudokuPuzzles with each legal digit at position i
-            # list all possible symbols in that place
-            return (
-                [SudokuPuzzle(n,
-                 symbols[:i] + [d] + symbols[i + 1:], symbol_set)
-                 for d in allowed_symbols])
-        
+        symbols = self._symbols
+        if "*" in symbols:
+            # position to fill, chosen by self._branching
+            i = self._branch_position()
+            # SudokuPuzzles with each legal digit at position i
+            for bit in self._ordered_bits(i):
+                move = (i, self._symbol_order[bit.bit_length() - 1])
+                if move != skip:
+                    yield move, self._place(i, bit)
+
+    def apply(self, move):
+        """
+        Return the extension of SudokuPuzzle self made by move, as
+        described in iter_moves.
+
+        @type self: SudokuPuzzle
+        @type move: (int, str)
+        @rtype: SudokuPuzzle
+
+        >>> grid = ["A", "B", "C", "D"]
+        >>> grid += ["C", "D", "A", "B"]
+        >>> grid += ["B", "A", "D", "C"]
+        >>> grid += ["D", "C", "B", "*"]
+        >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> s.apply((15, "A")).is_solved()
+        True
+        """
+        position, symbol = move
+        assert self._symbols[position] == "*"
+        return self._place(position, self._bits[symbol])
+
 
     # TODO
     # override fail_fast
@@ -193,151 +300,697 @@ class SudokuPuzzle(Puzzle):
     # in the same row, column, and subsquare exhaust the symbols available,
     # there is no point in continuing.
         """
-        Return False if there is one open position where the symbols already 
-        used in the same row, column, and subsquare exhaust the 
-        symbols available
-        
+        Return True if there is one open position where the symbols already
+        used in the same row, column, and subsquare exhaust the
+        symbols available.
+
+        Only the last position filled can have changed the candidates of
+        an extension, so just its peers are checked; a SudokuPuzzle made
+        by __init__ has no last position and checks every position.
+
+        @type self: SudokuPuzzle
+        @rtype: bool
+
+        >>> grid = ["A", "B", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> s.fail_fast()
+        False
+        >>> s._place(15, s._bits["C"]).fail_fast()
+        False
+        >>> grid[4], grid[8], grid[12] = "C", "D", "*"
+        >>> grid[13], grid[14], grid[15] = "A", "B", "C"
+        >>> SudokuPuzzle(4, grid, {"A", "B", "C", "D"}).fail_fast()
+        True
         """
-        lst = []
-        for path in range(len(self._symbols)):
-            if self._symbols[path] == '*':
-                lst.append(path)
-        for i in lst:
-            allowed_symbols = (self._symbol_set -
-                               (self._row_set(i) |
-                                self._column_set(i) |
-                                self._subsquare_set(i)))
-            if not allowed_symbols:
+        if self._contradiction:
+            return True
+        symbols, candidates = self._symbols, self._candidates
+        if self._last is None:
+            positions = range(len(symbols))
+        else:
+            positions = _peers(self._n)[self._last]
+        for i in positions:
+            if symbols[i] == '*' and not candidates[i]:
                 return True
         return False
-        
+
+    def solve(self, mode="dlx", path=True):
+        """
+        Return a solution of SudokuPuzzle self, or None if there is none.
+
+        mode chooses how: "dlx" solves self as an exact cover problem
+        with Algorithm X on Dancing Links, "backtrack" fills a single
+        grid in place and undoes placements from a trail, and "search"
+        uses depth_first_solve on the extensions.  If path is True, return
+        the root of a PuzzleNode path of extensions from self to the
+        solution, as depth_first_solve does; otherwise return just the
+        solved SudokuPuzzle.
+
+        @type self: SudokuPuzzle
+        @type mode: str
+        @type path: bool
+        @rtype: PuzzleNode | SudokuPuzzle | None
+
+        >>> grid = ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "*", "D"]
+        >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> solution = s.solve(path=False)
+        >>> solution.is_solved() and solution._symbols[-1] == "D"
+        True
+        >>> node = s.solve()
+        >>> node.puzzle == s
+        True
+        >>> while node.children:
+        ...     node = node.children[0]
+        >>> node.puzzle == solution
+        True
+        >>> s.solve("backtrack", path=False).is_solved()
+        True
+        >>> grid[0] = grid[1] = "A"
+        >>> print(SudokuPuzzle(4, grid, {"A", "B", "C", "D"}).solve())
+        None
+        >>> print(SudokuPuzzle(4, grid, {"A", "B", "C", "D"}).solve(
+        ...     "backtrack"))
+        None
+        """
+        assert mode in ("dlx", "backtrack", "search")
+        if mode == "search":
+            node = depth_first_solve(self)
+            if node is None or path:
+                return node
+            while node.children:
+                node = node.children[0]
+            return node.puzzle
+        if mode == "dlx":
+            solution = self._exact_cover_solution()
+        else:
+            solution = self._backtrack_solution()
+        if solution is None or not path:
+            return solution
+        return self._path_to(solution)
+
+    def count_solutions(self, limit=None, max_workers=0):
+        """
+        Return the number of solutions of SudokuPuzzle self, counting no
+        further than limit if it is given: limit=2 tells whether self
+        has exactly one solution without enumerating the others.
+
+        Solutions are enumerated with Algorithm X after propagation.  If
+        max_workers is not 0, the extensions of self after propagation
+        are counted in a pool of max_workers processes (one per CPU if
+        None) with pool_map, and the rest are stopped once limit is
+        reached.
+
+        @type self: SudokuPuzzle
+        @type limit: int | None
+        @type max_workers: int | None
+        @rtype: int
+
+        >>> grid = ["A", "B", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> grid += ["*", "*", "*", "*"]
+        >>> s = SudokuPuzzle(4, grid, {"A", "B", "C", "D"})
+        >>> s.count_solutions()
+        24
+        >>> s.count_solutions(limit=2)
+        2
+        >>> s.count_solutions(max_workers=2)
+        24
+        >>> grid = ["A", "B", "C", "D", "C", "D", "A", "B"]
+        >>> grid += ["B", "A", "D", "C", "D", "C", "*", "*"]
+        >>> SudokuPuzzle(4, grid, {"A", "B", "C", "D"}).count_solutions(2)
+        1
+        """
+        if max_workers == 0:
+            problem = self._exact_cover()
+            if problem is None:
+                return 0
+            return sum(1 for _ in islice(problem[1].solutions(), limit))
+        start = self._copy()
+        if start._contradiction or not start._propagate_constraints():
+            return 0
+        if "*" not in start._symbols:
+            return start.count_solutions(limit)
+        i = start._branch_position()
+        count = 0
+        tasks = ((bit, (start._place(i, bit), limit))
+                 for bit in start._ordered_bits(i))
+        results = pool_map(_count_solutions, tasks, max_workers)
+        with closing(results):
+            for _, found in results:
+                count += found
+                if limit is not None and count >= limit:
+                    return limit
+        return count
+
+    def _exact_cover_solution(self):
+        # Return the solved SudokuPuzzle found by Algorithm X, or None.
+        #
+        # Each position needs exactly one symbol, and each row, column and
+        # subsquare needs each symbol exactly once: 4 * n ** 2 columns.
+        # There is a matrix row for the symbol at each filled position,
+        # and for each candidate symbol at each empty one, after
+        # propagation has filled what it can and pruned the rest.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: SudokuPuzzle | None
+        problem = self._exact_cover()
+        if problem is None:
+            return None
+        start, matrix, choices = problem
+        cover = next(matrix.solutions(), None)
+        if cover is None:
+            return None
+        symbols = start._symbols[:]
+        for row in cover:
+            m, bit = choices[row]
+            symbols[m] = self._symbol_order[bit.bit_length() - 1]
+        return SudokuPuzzle(self._n, symbols, self._symbol_set,
+                            self._branching, self._ordering, self._propagate)
+
+    def _exact_cover(self):
+        # Return (start, matrix, choices) for solving self as an exact
+        # cover problem, or None if propagation already finds a
+        # contradiction.  start is self after propagation, matrix the
+        # DancingLinks, and choices[row] the (position, bit) that matrix
+        # row stands for.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: (SudokuPuzzle, DancingLinks, list[(int, int)]) | None
+        start = self._copy()
+        if start._contradiction or not start._propagate_constraints():
+            return None
+        n, bits = self._n, self._bits
+        geometry = _geometry(n)
+        matrix = DancingLinks(4 * n ** 2)
+        choices = []
+        for m in range(n ** 2):
+            r, c, b = geometry[m]
+            if start._symbols[m] == "*":
+                mask = start._candidates[m]
+            else:
+                mask = bits[start._symbols[m]]
+            while mask:
+                bit = mask & -mask
+                mask ^= bit
+                k = bit.bit_length() - 1
+                matrix.add_row([m, n ** 2 + r * n + k,
+                                2 * n ** 2 + c * n + k,
+                                3 * n ** 2 + b * n + k])
+                choices.append((m, bit))
+        return start, matrix, choices
+
+    def _backtrack_solution(self):
+        # Return the solved SudokuPuzzle found by backtracking, or None.
+        #
+        # A single bytearray grid (0 for empty, else 1 + the index of the
+        # symbol) and the row, column and subsquare masks are changed in
+        # place.  Each placement is pushed on a trail, and backtracking
+        # pops placements off it, so no puzzle is built until the end.
+        # The position filled next is always one with fewest symbols
+        # left, unless some symbol has only one place left in a row,
+        # column or subsquare, so forced positions are filled before any
+        # guess.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: SudokuPuzzle | None
+        n, bits, geometry = self._n, self._bits, _geometry(self._n)
+        full = (1 << n) - 1
+        grid = bytearray(n ** 2)
+        rows, columns, boxes = [0] * n, [0] * n, [0] * n
+        for m in range(n ** 2):
+            if self._symbols[m] != "*":
+                r, c, b = geometry[m]
+                bit = bits[self._symbols[m]]
+                if (rows[r] | columns[c] | boxes[b]) & bit:
+                    return None
+                rows[r] |= bit
+                columns[c] |= bit
+                boxes[b] |= bit
+                grid[m] = bit.bit_length()
+        empty = [m for m in range(n ** 2) if not grid[m]]
+        # positions filled, in order, and for each guess made the
+        # position, the bits not yet tried there and the trail length
+        trail, guesses = [], []
+        while True:
+            best, best_mask, best_count = -1, 0, n + 1
+            for m in empty:
+                if not grid[m]:
+                    r, c, b = geometry[m]
+                    mask = full & ~(rows[r] | columns[c] | boxes[b])
+                    count = bin(mask).count("1")
+                    if count < best_count:
+                        best, best_mask, best_count = m, mask, count
+                        if count <= 1:
+                            break
+            if best < 0:
+                break
+            if best_count > 1:
+                best, best_mask = self._hidden_single(grid, rows, columns,
+                                                      boxes, best, best_mask)
+            if best_mask:
+                guesses.append((best, best_mask, len(trail)))
+            # place the next untried bit of the latest guess, undoing
+            # what was placed since it, or backtrack further
+            while guesses:
+                m, mask, mark = guesses[-1]
+                while len(trail) > mark:
+                    p = trail.pop()
+                    r, c, b = geometry[p]
+                    bit = 1 << (grid[p] - 1)
+                    rows[r] ^= bit
+                    columns[c] ^= bit
+                    boxes[b] ^= bit
+                    grid[p] = 0
+                if mask:
+                    bit = mask & -mask
+                    guesses[-1] = (m, mask ^ bit, mark)
+                    r, c, b = geometry[m]
+                    rows[r] |= bit
+                    columns[c] |= bit
+                    boxes[b] |= bit
+                    grid[m] = bit.bit_length()
+                    trail.append(m)
+                    break
+                guesses.pop()
+            else:
+                return None
+        order = self._symbol_order
+        return SudokuPuzzle(n, [order[k - 1] for k in grid], self._symbol_set,
+                            self._branching, self._ordering, self._propagate)
+
+    def _hidden_single(self, grid, rows, columns, boxes, m, mask):
+        # Return (position, mask) for _backtrack_solution to fill next:
+        # a position and the bit of a symbol with no other place in some
+        # row, column or subsquare, or (m, 0) if some symbol has no place
+        # left in one, or m and mask unchanged if neither happens.
+        #
+        # @type self: SudokuPuzzle
+        # @type grid: bytearray
+        # @type rows: list[int]
+        # @type columns: list[int]
+        # @type boxes: list[int]
+        # @type m: int
+        # @type mask: int
+        # @rtype: (int, int)
+        n, geometry = self._n, _geometry(self._n)
+        full = (1 << n) - 1
+        for unit in _units(n):
+            # symbols placed in unit, and those allowed at one or more
+            # and at two or more of its empty positions
+            placed = once = twice = 0
+            for p in unit:
+                if grid[p]:
+                    placed |= 1 << (grid[p] - 1)
+                else:
+                    r, c, b = geometry[p]
+                    allowed = full & ~(rows[r] | columns[c] | boxes[b])
+                    twice |= once & allowed
+                    once |= allowed
+            if placed | once != full:
+                return m, 0
+            single = once & ~twice
+            if single:
+                bit = single & -single
+                for p in unit:
+                    r, c, b = geometry[p]
+                    if not grid[p] and not (rows[r] | columns[c] |
+                                            boxes[b]) & bit:
+                        return p, bit
+        return m, mask
+
+    def _path_to(self, solution):
+        # Return the root of a PuzzleNode path from self to solution in
+        # which each puzzle is the extension of the one before that
+        # agrees with solution.  Only that extension is built.
+        #
+        # @type self: SudokuPuzzle
+        # @type solution: SudokuPuzzle
+        # @rtype: PuzzleNode
+        node = root = PuzzleNode(self)
+        puzzle = self
+        while "*" in puzzle._symbols:
+            i = puzzle._branch_position()
+            puzzle = puzzle._place(i, self._bits[solution._symbols[i]])
+            node.children = [PuzzleNode(puzzle, [], node)]
+            node = node.children[0]
+        return root
+
 
     # some helper methods
-    def _row_set(self, m):
+    def _used_masks(self):
+        # Return lists of bitmasks of the symbols used in each row, column
+        # and subsquare of SudokuPuzzle self.
         #
-        # Return set of symbols in row of SudokuPuzzle self's symbols
-        # where position m occurs.
+        # @type self: SudokuPuzzle
+        # @rtype: (list[int], list[int], list[int])
+        n, bits = self._n, self._bits
+        rows, columns, boxes = [0] * n, [0] * n, [0] * n
+        geometry = _geometry(n)
+        for i in range(n ** 2):
+            if self._symbols[i] != "*":
+                r, c, b = geometry[i]
+                bit = bits[self._symbols[i]]
+                rows[r] |= bit
+                columns[c] |= bit
+                boxes[b] |= bit
+        return rows, columns, boxes
+
+    def _unused(self, m):
+        # Return the bitmask of symbols not yet used in the row, column or
+        # subsquare of position m.
         #
         # @type self: SudokuPuzzle
         # @type m: int
-        assert 0 <= m < self._n ** 2
-        # convenient names
-        n, symbols = self._n, self._symbols
-        # first position in m's row
-        r = (m // n) * n
-        # set of elements from symbols[r] .. symbols[r+n-1]
-        return set([symbols[r + i] for i in range(n)])
-
-    def _column_set(self, m):
-        # Return set of symbols in column of SudokuPuzzle self's symbols
-        # where position m occurs.
+        # @rtype: int
+        r, c, b = _geometry(self._n)[m]
+        return ((1 << self._n) - 1) & ~(self._rows[r] | self._columns[c] |
+                                         self._boxes[b])
+
+    def _branch_position(self):
+        # Return the empty position extensions should fill.  For "mrv" a
+        # position with one allowed symbol is taken at once, since it is
+        # forced anyway.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: int
+        symbols, candidates = self._symbols, self._candidates
+        if self._branching == "first":
+            return symbols.index("*")
+        best, best_count, best_degree = -1, self._n + 1, -1
+        for m in range(len(symbols)):
+            if symbols[m] == "*":
+                count = bin(candidates[m]).count("1")
+                if count <= 1:
+                    return m
+                if count <= best_count:
+                    degree = len([p for p in _peers(self._n)[m]
+                                  if symbols[p] == "*"])
+                    if count < best_count or degree > best_degree:
+                        best, best_count, best_degree = m, count, degree
+        return best
+
+    def _ordered_bits(self, m):
+        # Return the bits of the symbols allowed at position m, in the
+        # order given by self._ordering.
         #
         # @type self: SudokuPuzzle
         # @type m: int
-        assert 0 <= m <= self._n ** 2
-        # convenient names
-        symbols, n = self._symbols, self._n
-        # first position in m's column
-        c = m % n
-        # set of elements from symbols[c], symbols[c + n],
-        # ... symbols[c + (n * (n-1))]
-        return set([symbols[c + (i * n)] for i in range(n)])
-
-    def _subsquare_set(self, m):
-        # Return set of symbols in subsquare of SudokuPuzzle self's symbols
-        # where position m occurs.
+        # @rtype: list[int]
+        allowed, bits = self._candidates[m], []
+        while allowed:
+            bit = allowed & -allowed
+            allowed ^= bit
+            bits.append(bit)
+        if self._ordering == "lcv" and len(bits) > 1:
+            # masks of the symbols allowed at each empty peer of m
+            peer_masks = [self._candidates[p] for p in _peers(self._n)[m]
+                          if self._symbols[p] == "*"]
+            bits.sort(key=lambda b: len([x for x in peer_masks if x & b]))
+        return bits
+
+    def _place(self, m, bit):
+        # Return a new SudokuPuzzle like self with the symbol for bit at
+        # position m, followed by propagation if self._propagate.
         #
         # @type self: SudokuPuzzle
         # @type m: int
-        assert 0 <= m < self._n ** 2
-        # convenient names
-        n, symbols = self._n, self._symbols
-        # row, column where m occur
-        row, col = m // n, m % n
-        # length of subsquares
+        # @type bit: int
+        # @rtype: SudokuPuzzle
+        child = self._copy()
+        child._last = m
+        child._contradiction = not (child._assign(m, bit) and
+                                    (not child._propagate or
+                                     child._propagate_constraints()))
+        return child
+
+    def _copy(self):
+        # Return a new SudokuPuzzle equal to self.  The masks are copied
+        # rather than recomputed, and __init__'s checks are skipped since
+        # self was already checked.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: SudokuPuzzle
+        copy = SudokuPuzzle.__new__(SudokuPuzzle)
+        copy._n, copy._symbol_set = self._n, self._symbol_set
+        copy._branching, copy._ordering = self._branching, self._ordering
+        copy._propagate = self._propagate
+        copy._symbol_order, copy._bits = self._symbol_order, self._bits
+        copy._symbols = self._symbols[:]
+        copy._rows, copy._columns = self._rows[:], self._columns[:]
+        copy._boxes = self._boxes[:]
+        copy._candidates = self._candidates[:]
+        copy._contradiction = self._contradiction
+        copy._last = self._last
+        return copy
+
+    def _assign(self, m, bit):
+        # Put the symbol for bit at position m of SudokuPuzzle self, and
+        # remove it from the candidates of m's peers.  Return False if that
+        # leaves some empty peer without candidates.
+        #
+        # Only used while building a new SudokuPuzzle in _place.
+        #
+        # @type self: SudokuPuzzle
+        # @type m: int
+        # @type bit: int
+        # @rtype: bool
+        self._symbols[m] = self._symbol_order[bit.bit_length() - 1]
+        r, c, b = _geometry(self._n)[m]
+        self._rows[r] |= bit
+        self._columns[c] |= bit
+        self._boxes[b] |= bit
+        candidates = self._candidates
+        candidates[m] = 0
+        consistent = True
+        for p in _peers(self._n)[m]:
+            if candidates[p] & bit:
+                candidates[p] &= ~bit
+                if not candidates[p]:
+                    consistent = False
+        return consistent
+
+    def _propagate_constraints(self):
+        # Apply naked singles, hidden singles, naked pairs and hidden pairs
+        # to SudokuPuzzle self until none of them changes anything.
+        # Return False if a contradiction is found: an empty position with
+        # no candidates, or a symbol with no place left in some row, column
+        # or subsquare.
+        #
+        # Only used while building a new SudokuPuzzle in _place.
+        #
+        # @type self: SudokuPuzzle
+        # @rtype: bool
+        n, symbols, candidates = self._n, self._symbols, self._candidates
+        full = (1 << n) - 1
+        changed = True
+        while changed:
+            changed = False
+            # naked singles: an empty position with one candidate
+            for m in range(n ** 2):
+                if symbols[m] == "*":
+                    bits = candidates[m]
+                    if not bits:
+                        return False
+                    if not bits & (bits - 1):
+                        if not self._assign(m, bits):
+                            return False
+                        changed = True
+            for unit in _units(n):
+                # symbols possible in at least one, two and three
+                # positions of unit
+                once, twice, thrice = 0, 0, 0
+                placed = 0
+                for m in unit:
+                    bits = candidates[m]
+                    thrice |= twice & bits
+                    twice |= once & bits
+                    once |= bits
+                    if symbols[m] != "*":
+                        placed |= self._bits[symbols[m]]
+                if full & ~(placed | once):
+                    return False
+                # hidden singles: a symbol with one place in unit
+                singles = once & ~twice
+                while singles:
+                    bit = singles & -singles
+                    singles ^= bit
+                    for m in unit:
+                        if candidates[m] & bit:
+                            if not self._assign(m, bit):
+                                return False
+                            changed = True
+                            break
+                if changed:
+                    # candidates in unit may be stale; start over
+                    break
+                if self._reduce_pairs(unit, twice & ~thrice):
+                    changed = True
+        return True
+
+    def _reduce_pairs(self, unit, doubles):
+        # Remove candidates ruled out by naked and hidden pairs in unit,
+        # where doubles is the mask of symbols possible at exactly two
+        # positions of unit.  Return whether any candidate was removed.
+        #
+        # Only used while building a new SudokuPuzzle in _place.
+        #
+        # @type self: SudokuPuzzle
+        # @type unit: list[int]
+        # @type doubles: int
+        # @rtype: bool
+        candidates, changed = self._candidates, False
+        # naked pairs: two positions with the same two candidates, which
+        # can then be nowhere else in unit
+        pairs = {}
+        for m in unit:
+            bits = candidates[m]
+            if bits and bin(bits).count("1") == 2:
+                pairs.setdefault(bits, []).append(m)
+        for bits in pairs:
+            if len(pairs[bits]) == 2:
+                for m in unit:
+                    if m not in pairs[bits] and candidates[m] & bits:
+                        candidates[m] &= ~bits
+                        changed = True
+        # hidden pairs: two symbols possible only at the same two
+        # positions, which can then hold nothing else
+        places = {}
+        while doubles:
+            bit = doubles & -doubles
+            doubles ^= bit
+            where = tuple([m for m in unit if candidates[m] & bit])
+            places.setdefault(where, 0)
+            places[where] |= bit
+        for where in places:
+            bits = places[where]
+            if len(where) == 2 and bits & (bits - 1):
+                for m in where:
+                    if candidates[m] & ~bits:
+                        candidates[m] &= bits
+                        changed = True
+        return changed
+
+
+# helper functions
+_geometry_cache = {}
+_symbol_bits_cache = {}
+_peers_cache = {}
+_units_cache = {}
+
+
+def _geometry(n):
+    """
+    Return a list giving the (row, column, subsquare) of each position
+    of an nxn sudoku, caching the result per n.
+
+    @type n: int
+    @rtype: list[(int, int, int)]
+
+    >>> _geometry(4)[7]
+    (1, 3, 1)
+    """
+    if n not in _geometry_cache:
         ss = round(n ** (1 / 2))
-        # upper-left position of m's subsquare
-        ul = (((row // ss) * ss) * n) + ((col // ss) * ss)
-        # return set of symbols from subsquare starting at ul
-        return set(
-            [symbols[ul + i + n * j] for i in range(ss) for j in range(ss)])
+        _geometry_cache[n] = [(m // n, m % n,
+                               (m // n // ss) * ss + (m % n) // ss)
+                              for m in range(n ** 2)]
+    return _geometry_cache[n]
+
+
+def _peers(n):
+    """
+    Return a list giving, for each position of an nxn sudoku, the list of
+    other positions in its row, column or subsquare, caching the result
+    per n.
+
+    @type n: int
+    @rtype: list[list[int]]
+
+    >>> _peers(4)[0]
+    [1, 2, 3, 4, 5, 8, 12]
+    """
+    if n not in _peers_cache:
+        geometry = _geometry(n)
+        _peers_cache[n] = [[p for p in range(n ** 2) if p != m and
+                            (geometry[p][0] == geometry[m][0] or
+                             geometry[p][1] == geometry[m][1] or
+                             geometry[p][2] == geometry[m][2])]
+                           for m in range(n ** 2)]
+    return _peers_cache[n]
+
+
+def _units(n):
+    """
+    Return the list of rows, columns and subsquares of an nxn sudoku, each
+    as a list of positions, caching the result per n.
+
+    @type n: int
+    @rtype: list[list[int]]
+
+    >>> units = _units(4)
+    >>> units[0], units[4], units[8]
+    ([0, 1, 2, 3], [0, 4, 8, 12], [0, 1, 4, 5])
+    """
+    if n not in _units_cache:
+        geometry = _geometry(n)
+        units = [[] for _ in range(3 * n)]
+        for m in range(n ** 2):
+            r, c, b = geometry[m]
+            units[r].append(m)
+            units[n + c].append(m)
+            units[2 * n + b].append(m)
+        _units_cache[n] = units
+    return _units_cache[n]
+
+
+def _count_solutions(puzzle, limit):
+    """
+    Return puzzle.count_solutions(limit); the work a worker process does
+    for SudokuPuzzle.count_solutions.  Counting stops early, returning
+    the count so far, once stop_requested, which the search itself polls
+    so a subtree with few solutions is not searched to the end.
+
+    @type puzzle: SudokuPuzzle
+    @type limit: int | None
+    @rtype: int
+    """
+    problem = puzzle._exact_cover()
+    if problem is None:
+        return 0
+    solutions = problem[1].solutions(stop_requested)
+    return sum(1 for _ in islice(solutions, limit))
+
+
+def _symbol_bits(symbol_set):
+    """
+    Return (symbols, bits) where symbols is symbol_set in sorted order
+    and bits maps each symbol to 1 << its index in symbols, caching the
+    result per symbol set.
+
+    @type symbol_set: set[str]
+    @rtype: (tuple[str], dict[str, int])
+
+    >>> _symbol_bits({"B", "A"})
+    (('A', 'B'), {'A': 1, 'B': 2})
+    """
+    key = frozenset(symbol_set)
+    if key not in _symbol_bits_cache:
+        symbols = tuple(sorted(symbol_set))
+        _symbol_bits_cache[key] = (symbols, {symbols[i]: 1 << i
+                                             for i in range(len(symbols))})
+    return _symbol_bits_cache[key]
 
 
 if __name__ == "__main__":
     import doctest
-
     doctest.testmod()
-    s = SudokuPuzzle(9,
-                     ["*", "*", "*", "7", "*", "8", "*", "1", "*",
-                      "*", "*", "7", "*", "9", "*", "*", "*", "6",
-                      "9", "*", "3", "1", "*", "*", "*", "*", "*",
-                      "3", "5", "*", "8", "*", "*", "6", "*", "1",
-                      "*", "*", "*", "*", "*", "*", "*", "*", "*",
-                      "1", "*", "6", "*", "*", "9", "*", "4", "8",
-                      "*", "*", "*", "*", "*", "1", "2", "*", "7",
-                      "8", "*", "*", "*", "7", "*", "4", "*", "*",
-                      "*", "6", "*", "3", "*", "2", "*", "*", "*"],
-                     {"1", "2", "3", "4", "5", "6", "7", "8", "9"})
-
-    from time import time
-
-    print("solving sudoku from July 9 2015 Star... \n\n{}\n\n".format(s))
-    from puzzle_tools import depth_first_solve
-
-    start = time()
-    sol = depth_first_solve(s)
-    print(sol)
-    while sol.children:
-        sol = sol.children[0]
-    end = time()
-    print("time to solve 9x9 using depth_first: "
-          "{} seconds\n".format(end - start))
-    print(sol)
-
-    s = SudokuPuzzle(9,
-                     ["*", "*", "*", "9", "*", "2", "*", "*", "*",
-                      "*", "9", "1", "*", "*", "*", "6", "3", "*",
-                      "*", "3", "*", "*", "7", "*", "*", "8", "*",
-                      "3", "*", "*", "*", "*", "*", "*", "*", "8",
-                      "*", "*", "9", "*", "*", "*", "2", "*", "*",
-                      "5", "*", "*", "*", "*", "*", "*", "*", "7",
-                      "*", "7", "*", "*", "8", "*", "*", "4", "*",
-                      "*", "4", "5", "*", "*", "*", "8", "1", "*",
-                      "*", "*", "*", "3", "*", "6", "*", "*", "*"],
-                     {"1", "2", "3", "4", "5", "6", "7", "8", "9"})
-
-    print("solving 3-star sudoku from \"That's Puzzling\","
-          "November 14th 2015\n\n{}\n\n".format(s))
-    start = time()
-    sol = depth_first_solve(s)
-    while sol.children:
-        sol = sol.children[0]
-    end = time()
-    print("time to solve 9x9 using depth_first: {} seconds\n".format(
-        end - start))
-    print(sol)
-
-    s = SudokuPuzzle(9,
-                     ["5", "6", "*", "*", "*", "7", "*", "*", "9",
-                      "*", "7", "*", "*", "4", "8", "*", "3", "1",
-                      "*", "*", "*", "*", "*", "*", "*", "*", "*",
-                      "4", "3", "*", "*", "*", "*", "*", "*", "*",
-                      "*", "8", "*", "*", "*", "*", "*", "9", "*",
-                      "*", "*", "*", "*", "*", "*", "*", "2", "6",
-                      "*", "*", "*", "*", "*", "*", "*", "*", "*",
-                      "1", "9", "*", "3", "6", "*", "*", "7", "*",
-                      "7", "*", "*", "1", "*", "*", "*", "4", "2"],
-                     {"1", "2", "3", "4", "5", "6", "7", "8", "9"})
-
-    print(
-        "solving 4-star sudoku from \"That's Puzzling\", "
-        "November 14th 2015\n\n{}\n\n".format(
-            s))
-    start = time()
-    sol = depth_first_solve(s)
-    while sol.children:
-        sol = sol.children[0]
-    end = time()
-    print("time to solve 9x9 using depth_first: {} seconds\n".format(
-        end - start))
-    print(sol)
+    from puzzle_benchmark import main
+    main(["sudoku-july-9-2015", "sudoku-3-star", "sudoku-4-star",
+          "--repeat", "1", "--warmup", "0", "--show"])
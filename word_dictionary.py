@@ -0,0 +1,544 @@
+"""
+Shared, immutable word dictionaries for WordLadderPuzzle
+
+A WordDictionary holds a fixed set of words and an index from wildcard
+patterns such as "s_me" to the words matching them, so the neighbours of
+a word are found with one lookup per letter.  Dictionaries are interned:
+word_dictionary returns the same object for equal word sets, so every
+puzzle in a search refers to one dictionary and puzzles can compare
+dictionaries by identity.
+
+A dictionary can also be compiled to a file holding its words, grouped
+by length, and its wildcard index, and then loaded through mmap: nothing
+is read until a word is first looked up, and processes using the same
+file share one copy.  Run "python word_dictionary.py --help" to compile
+one from the command line.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+import weakref
+from array import array
+from puzzle_tools import write_atomically
+
+# first line of a compiled dictionary file
+MAGIC = b"WORDS 1\n"
+# frozenset of words, or absolute path of a compiled file -> its
+# WordDictionary, for as long as something else refers to it
+_dictionary_cache = weakref.WeakValueDictionary()
+
+
+def word_dictionary(words):
+    """
+    Return the WordDictionary of words, shared by every call with an
+    equal collection of words while it is in use.  A WordDictionary is
+    returned as it is.
+
+    @type words: Iterable[str] | WordDictionary
+    @rtype: WordDictionary
+
+    >>> d = word_dictionary({"same", "some"})
+    >>> d is word_dictionary(["some", "same"]), d is word_dictionary(d)
+    (True, True)
+    """
+    if isinstance(words, WordDictionary):
+        return words
+    words = frozenset(words)
+    dictionary = _dictionary_cache.get(words)
+    if dictionary is None:
+        dictionary = _dictionary_cache[words] = WordDictionary(words)
+    return dictionary
+
+
+class WordDictionary:
+    """
+    A fixed set of words with a wildcard index.  Use word_dictionary
+    rather than creating one directly, so equal word sets share one.
+
+    === Attributes ===
+    @type words: frozenset[str]
+        the words of the dictionary
+    """
+
+    def __init__(self, words):
+        """
+        Create a new WordDictionary self of words.
+
+        @type self: WordDictionary
+        @type words: Iterable[str]
+        @rtype: None
+        """
+        self.words = frozenset(words)
+        # word length -> wildcard pattern -> words matching it, built for
+        # a length when first needed
+        self._index = {}
+
+    def __reduce__(self):
+        """
+        Return how to pickle WordDictionary self: by its words, interned
+        again when unpickled so a worker process shares one copy too.
+
+        @type self: WordDictionary
+        @rtype: tuple
+        """
+        return word_dictionary, (self.words,)
+
+    def __contains__(self, word):
+        """
+        Return whether word is in WordDictionary self.
+
+        @type self: WordDictionary
+        @type word: str
+        @rtype: bool
+        """
+        return word in self.words
+
+    def __len__(self):
+        """
+        Return the number of words in WordDictionary self.
+
+        @type self: WordDictionary
+        @rtype: int
+        """
+        return len(self.words)
+
+    def __iter__(self):
+        """
+        Return an iterator over the words of WordDictionary self.
+
+        @type self: WordDictionary
+        @rtype: Iterator[str]
+        """
+        return iter(self.words)
+
+    def bucket(self, pattern):
+        """
+        Return the sorted list of words of WordDictionary self matching
+        pattern, a word with one letter replaced by "_".
+
+        A word holding "_" itself may also be listed under a pattern
+        with "_" elsewhere, so callers should check the letter at the
+        wildcard.
+
+        @type self: WordDictionary
+        @type pattern: str
+        @rtype: list[str]
+
+        >>> d = WordDictionary({"same", "some", "came", "cat"})
+        >>> d.bucket("s_me"), d.bucket("_ame"), d.bucket("c_t")
+        (['same', 'some'], ['came', 'same'], ['cat'])
+        >>> d.bucket("x_x")
+        []
+        """
+        length = len(pattern)
+        if length not in self._index:
+            self._index[length] = _wildcard_buckets(self.words, length)
+        return self._index[length].get(pattern, [])
+
+
+def _wildcard_buckets(words, length):
+    """
+    Return a dict mapping each pattern made by replacing one letter of a
+    word of length in words with "_" to the sorted list of those words.
+
+    @type words: Iterable[str]
+    @type length: int
+    @rtype: dict[str, list[str]]
+    """
+    buckets = {}
+    for word in sorted([word for word in words if len(word) == length]):
+        for i in range(length):
+            buckets.setdefault(word[:i] + "_" + word[i + 1:], []).append(word)
+    return buckets
+
+
+def compile_words(words, path):
+    """
+    Save the words as a compiled dictionary file at path, for load_words.
+
+    The file is MAGIC, a line of JSON giving where the sections for each
+    word length start and how long they are, then the sections.  For a
+    length n, "words" is the sorted UTF-8 words run together and
+    "word_offsets" an array of 4 byte unsigned ints giving where each
+    starts, followed by where the last ends.  "patterns" is the wildcard
+    index: an array holding i * n + j for each word i and position j,
+    sorted by the pattern made by replacing letter j of word i with "_",
+    so each bucket is a run of entries.  Most patterns match a single
+    word, so this is much smaller than storing the patterns themselves.
+
+    @type words: Iterable[str]
+    @type path: str
+    @rtype: None
+    """
+    by_length = {}
+    # sorting str and sorting UTF-8 bytes give the same order
+    for word in sorted(set(words)):
+        by_length.setdefault(len(word), []).append(word)
+    body, lengths = bytearray(), {}
+
+    def add(data):
+        # sections start at multiples of 4, so the arrays are aligned
+        body.extend(b"\0" * (-len(body) % 4))
+        start = len(body)
+        body.extend(data)
+        return [start, len(data)]
+
+    for length, group in sorted(by_length.items()):
+        entries = sorted([(word[:j] + "_" + word[j + 1:], i * length + j)
+                          for i, word in enumerate(group)
+                          for j in range(length)])
+        word_blob, word_offsets = _run_together(group)
+        lengths[length] = {
+            "words": add(word_blob),
+            "word_offsets": add(word_offsets.tobytes()),
+            "patterns": add(array("I", [e[1] for e in entries]).tobytes())}
+    header = json.dumps({"byteorder": sys.byteorder,
+                         "count": sum([len(g) for g in by_length.values()]),
+                         "lengths": lengths}).encode()
+    # padded so the sections after it stay aligned
+    header += b" " * (-(len(MAGIC) + len(header) + 1) % 4) + b"\n"
+    write_atomically(path, [MAGIC, header, body])
+
+
+def load_words(path):
+    """
+    Return the WordDictionary compiled to path by compile_words, shared
+    by every call with the same file.  The file is not opened until the
+    dictionary is first used.
+
+    @type path: str
+    @rtype: WordDictionary
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, "words.wdb")
+    ...     compile_words(["same", "some", "came", "cat", "Åse"], path)
+    ...     d = load_words(path)
+    ...     print(d is load_words(path), len(d), "some" in d, "sam" in d)
+    ...     print(d.bucket("s_me"), d.bucket("_ame"), d.bucket("Å_e"))
+    True 5 True False
+    ['same', 'some'] ['came', 'same'] ['Åse']
+    """
+    key = os.path.abspath(path)
+    dictionary = _dictionary_cache.get(key)
+    if dictionary is None:
+        dictionary = _dictionary_cache[key] = MappedWordDictionary(key)
+    return dictionary
+
+
+def load_or_compile(source, directory=None):
+    """
+    Return the WordDictionary of the whitespace separated words in the
+    file source, compiled into directory (the directory of source by
+    default), compiling it first if there is no compiled file yet or
+    source has changed since.  After recompiling, the new file is
+    loaded even if this process loaded the old one.
+
+    @type source: str
+    @type directory: str | None
+    @rtype: WordDictionary
+    """
+    directory = os.path.dirname(source) if directory is None else directory
+    path = os.path.join(directory, os.path.basename(source) + ".wdb")
+    if (not os.path.exists(path) or
+            os.path.getmtime(path) < os.path.getmtime(source)):
+        with open(source, "r") as words:
+            compile_words(words.read().split(), path)
+        # a dictionary loaded before maps the file that was replaced
+        _dictionary_cache.pop(os.path.abspath(path), None)
+    return load_words(path)
+
+
+class MappedWordDictionary(WordDictionary):
+    """
+    A WordDictionary read from a file made by compile_words.  Use
+    load_words rather than creating one directly, so each file is mapped
+    once.
+
+    Pickling keeps only the path, so worker processes map the same file
+    rather than copying the words.
+
+    === Attributes ===
+    @type path: str
+        the compiled dictionary file
+    """
+
+    def __init__(self, path):
+        """
+        Create a new MappedWordDictionary self for the file at path,
+        without opening it yet.
+
+        @type self: MappedWordDictionary
+        @type path: str
+        @rtype: None
+        """
+        self.path = path
+        self._map, self._header, self._base = None, None, 0
+        # word length -> its _Section, or None if there are no such words
+        self._sections = {}
+        self._words = None
+
+    def __reduce__(self):
+        """
+        Return how to pickle MappedWordDictionary self: by its path.
+
+        @type self: MappedWordDictionary
+        @rtype: tuple
+        """
+        return load_words, (self.path,)
+
+    def _open(self):
+        """
+        Map the file of MappedWordDictionary self, unless it is mapped
+        already.
+
+        @type self: MappedWordDictionary
+        @rtype: None
+        """
+        if self._map is None:
+            with open(self.path, "rb") as source:
+                assert source.readline() == MAGIC, \
+                    "not a compiled dictionary: {}".format(self.path)
+                self._header = json.loads(source.readline())
+                self._base = source.tell()
+                self._map = mmap.mmap(source.fileno(), 0,
+                                      access=mmap.ACCESS_READ)
+            assert self._header["byteorder"] == sys.byteorder
+
+    def _section(self, length):
+        """
+        Return the _Section of the words of length in
+        MappedWordDictionary self, or None if there are none.
+
+        @type self: MappedWordDictionary
+        @type length: int
+        @rtype: _Section | None
+        """
+        if length not in self._sections:
+            self._open()
+            layout = self._header["lengths"].get(str(length))
+            self._sections[length] = (
+                None if layout is None
+                else _Section(self._map, self._base, length, layout))
+        return self._sections[length]
+
+    @property
+    def words(self):
+        """
+        Return the words of MappedWordDictionary self, reading them all
+        from the file the first time.
+
+        @type self: MappedWordDictionary
+        @rtype: frozenset[str]
+        """
+        if self._words is None:
+            self._words = frozenset(iter(self))
+        return self._words
+
+    def __contains__(self, word):
+        """
+        Return whether word is in MappedWordDictionary self.
+
+        @type self: MappedWordDictionary
+        @type word: str
+        @rtype: bool
+        """
+        section = self._section(len(word))
+        return section is not None and section.find_word(word) >= 0
+
+    def __len__(self):
+        """
+        Return the number of words in MappedWordDictionary self.
+
+        @type self: MappedWordDictionary
+        @rtype: int
+        """
+        self._open()
+        return self._header["count"]
+
+    def __iter__(self):
+        """
+        Yield the words of MappedWordDictionary self, shortest first and
+        in sorted order within a length.
+
+        @type self: MappedWordDictionary
+        @rtype: Iterator[str]
+        """
+        self._open()
+        for length in sorted([int(n) for n in self._header["lengths"]]):
+            section = self._section(length)
+            for i in range(len(section.word_offsets) - 1):
+                yield section.word(i)
+
+    def bucket(self, pattern):
+        """
+        Return the sorted list of words of MappedWordDictionary self
+        matching pattern, as WordDictionary.bucket does.
+
+        @type self: MappedWordDictionary
+        @type pattern: str
+        @rtype: list[str]
+        """
+        section = self._section(len(pattern))
+        if section is None:
+            return []
+        codes, length, bucket = section.patterns, len(pattern), []
+        k = section.first_pattern(pattern)
+        while k < len(codes) and section.pattern(codes[k]) == pattern:
+            bucket.append(section.word(codes[k] // length))
+            k += 1
+        return bucket
+
+
+class _Section:
+    """
+    Views of the sections of a compiled dictionary file for one word
+    length, as described in compile_words.
+    """
+
+    def __init__(self, data, base, length, layout):
+        """
+        Create a new _Section self for the sections of the words of
+        length in the mapped file data, at offsets in layout counted from
+        base.
+
+        @type self: _Section
+        @type data: mmap.mmap
+        @type base: int
+        @type length: int
+        @type layout: dict[str, list[int]]
+        @rtype: None
+        """
+        view, self.length = memoryview(data), length
+        for name, (start, size) in layout.items():
+            part = view[base + start:base + start + size]
+            setattr(self, name, part if name == "words" else part.cast("I"))
+
+    def word(self, i):
+        """
+        Return word i of _Section self.
+
+        @type self: _Section
+        @type i: int
+        @rtype: str
+        """
+        offsets = self.word_offsets
+        return str(self.words[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def find_word(self, word):
+        """
+        Return the index of word in _Section self, or -1 if it is not
+        there.
+
+        @type self: _Section
+        @type word: str
+        @rtype: int
+        """
+        return _search(self.words, self.word_offsets, word.encode())
+
+    def pattern(self, code):
+        """
+        Return the wildcard pattern of entry code of the index of
+        _Section self.
+
+        @type self: _Section
+        @type code: int
+        @rtype: str
+        """
+        word, j = self.word(code // self.length), code % self.length
+        return word[:j] + "_" + word[j + 1:]
+
+    def first_pattern(self, pattern):
+        """
+        Return the index of the first entry of the index of _Section self
+        whose pattern is not less than pattern.
+
+        @type self: _Section
+        @type pattern: str
+        @rtype: int
+        """
+        codes = self.patterns
+        low, high = 0, len(codes)
+        while low < high:
+            middle = (low + high) // 2
+            if self.pattern(codes[middle]) < pattern:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+
+def _search(blob, offsets, key):
+    """
+    Return the index of bytes key among the sorted items run together in
+    blob, item i running from offsets[i] to offsets[i + 1], or -1 if key
+    is not there.
+
+    @type blob: memoryview
+    @type offsets: Sequence[int]
+    @type key: bytes
+    @rtype: int
+
+    >>> blob, offsets = _run_together(["cat", "cot", "dog"])
+    >>> _search(memoryview(blob), offsets, b"cot")
+    1
+    >>> _search(memoryview(blob), offsets, b"cow")
+    -1
+    """
+    low, high = 0, len(offsets) - 1
+    while low < high:
+        middle = (low + high) // 2
+        item = blob[offsets[middle]:offsets[middle + 1]]
+        if item == key:
+            return middle
+        elif bytes(item) < key:
+            low = middle + 1
+        else:
+            high = middle
+    return -1
+
+
+def _run_together(items):
+    """
+    Return (blob, offsets): the UTF-8 items joined, and an array giving
+    where each starts followed by where the last ends.
+
+    @type items: list[str]
+    @rtype: (bytes, array)
+
+    >>> _run_together(["ab", "c"])
+    (b'abc', array('I', [0, 2, 3]))
+    """
+    encoded = [item.encode() for item in items]
+    offsets, end = array("I", [0]), 0
+    for item in encoded:
+        end += len(item)
+        offsets.append(end)
+    return b"".join(encoded), offsets
+
+
+def main(argv=None):
+    """
+    Compile the dictionary named by the command line arguments argv (the
+    process arguments by default), and return the exit status.
+
+    @type argv: list[str] | None
+    @rtype: int
+    """
+    parser = argparse.ArgumentParser(
+        description="Compile a word list for WordLadderPuzzle.")
+    parser.add_argument("source", help="file of whitespace separated words")
+    parser.add_argument("output", nargs="?", default=None,
+                        help="compiled file (default: source + .wdb)")
+    args = parser.parse_args(argv)
+    output = args.source + ".wdb" if args.output is None else args.output
+    with open(args.source, "r") as words:
+        compile_words(words.read().split(), output)
+    print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,18 @@
 from puzzle import Puzzle
+from word_dictionary import word_dictionary
 
 
 class WordLadderPuzzle(Puzzle):
     """
     A word-ladder puzzle that may be solved, unsolved, or even unsolvable.
+
+    Every puzzle stepped to from this one shares its WordDictionary, so a
+    puzzle holds little more than its two words.  Words already used are
+    not removed from the dictionary; solvers skip them through their own
+    record of puzzles seen.
     """
+    # set of characters to use for 1-character changes
+    _chars = "abcdefghijklmnopqrstuvwxyz"
 
     def __init__(self, from_word, to_word, ws):
         """
@@ -14,13 +22,11 @@ class WordLadderPuzzle(Puzzle):
 
         @type from_word: str
         @type to_word: str
-        @type ws: set[str]
+        @type ws: Iterable[str] | WordDictionary
         @rtype: None
         """
-        (self._from_word, self._to_word, self._word_set) = (from_word,
-                                                            to_word, ws)
-        # set of characters to use for 1-character changes
-        self._chars = "abcdefghijklmnopqrstuvwxyz"
+        (self._from_word, self._to_word, self._words) = (
+            from_word, to_word, word_dictionary(ws))
 
         # TODO
         # implement __eq__ and __str__
@@ -41,8 +47,71 @@ class WordLadderPuzzle(Puzzle):
         >>> w3 = WordLadderPuzzle("save", "cost", ws)
         >>> w1.__eq__(w3)
         False
+        >>> w1.__eq__(WordLadderPuzzle("same", "cost", ws - {"word"}))
+        False
+        >>> import os, tempfile
+        >>> from word_dictionary import compile_words, load_words
+        >>> path = os.path.join(tempfile.mkdtemp(), "words.dict")
+        >>> compile_words(ws, path)
+        >>> w1.__eq__(WordLadderPuzzle("same", "cost", load_words(path)))
+        True
+        """
+        # equal word sets share one interned dictionary, so identity is
+        # usually enough; only a compiled dictionary and one built from a
+        # set need their words compared
+        return (type(self) == type(other) and
+                self._from_word == other._from_word and
+                self._to_word == other._to_word and
+                (self._words is other._words or
+                 self._words.words == other._words.words))
+
+    __hash__ = Puzzle.__hash__
+
+    def state_key(self):
+        """
+        Return a hashable key identifying the configuration of
+        WordLadderPuzzle self.
+
+        The word set is the dictionary the ladder is drawn from rather than
+        part of the position, so only the two words are used.  This also
+        keeps the key cheap to hash for large dictionaries.
+
+        @type self: WordLadderPuzzle
+        @rtype: tuple[str]
+
+        >>> ws = {'cost', 'cat', 'cast', 'case', 'word', 'cave', 'save', 'money', 'party', 'same'}
+        >>> w1 = WordLadderPuzzle("same", "cost", ws)
+        >>> w1.state_key()
+        ('same', 'cost')
+        >>> len({w1, WordLadderPuzzle("same", "cost", ws)})
+        1
+        """
+        return (self._from_word, self._to_word)
+
+    def position_key(self):
+        """
+        Return the current word of WordLadderPuzzle self.
+
+        @type self: WordLadderPuzzle
+        @rtype: str
+
+        >>> WordLadderPuzzle("same", "cost", {"same", "cost"}).position_key()
+        'same'
         """
-        return (type(self) == type(other) and self._from_word == other._from_word and self._to_word == other._to_word and self._word_set == other._word_set)
+        return self._from_word
+
+    def reverse(self):
+        """
+        Return a WordLadderPuzzle stepping from _to_word to _from_word
+        through the same words.
+
+        @type self: WordLadderPuzzle
+        @rtype: WordLadderPuzzle
+
+        >>> print(WordLadderPuzzle("same", "cost", {"same", "cost"}).reverse())
+        cost -> same
+        """
+        return WordLadderPuzzle(self._to_word, self._from_word, self._words)
     
     def __str__(self):
         """
@@ -77,17 +146,89 @@ class WordLadderPuzzle(Puzzle):
         >>> len(L1) == len(L2)
         True
         """  
-        new = ''
-        result = []
-        ws = self._word_set.copy()
-        ws.remove(self._from_word)        
-        for i in range(len(self._from_word)):
-            for char in self._chars:  
-                new = self._from_word[:i] + char + self._from_word[i+1:]
-                for word in ws:
-                    if len(word) == len(self._from_word) and word == new:
-                        result.append(WordLadderPuzzle(new, self._to_word, ws))
-        return result        
+        return list(self.iter_extensions())
+
+    def iter_extensions(self):
+        """
+        Yield the extensions of WordLadderPuzzle self one at a time,
+        building each only when it is asked for.
+
+        @type self: WordLadderPuzzle
+        @rtype: Iterator[WordLadderPuzzle]
+
+        >>> ws = {'cost', 'cast', 'case', 'same', 'came'}
+        >>> w1 = WordLadderPuzzle("same", "cost", ws)
+        >>> print(next(w1.iter_extensions()))
+        came -> cost
+        """
+        for _, extension in self.iter_moves():
+            yield extension
+
+    def iter_moves(self, skip=None):
+        """
+        Yield (move, extension) for each extension of WordLadderPuzzle
+        self, where move is (index, char): the letter of from_word at
+        index changes to char.  Move skip is left out.
+
+        @type self: WordLadderPuzzle
+        @type skip: (int, str) | None
+        @rtype: Iterator[((int, str), WordLadderPuzzle)]
+
+        >>> ws = {'cost', 'cast', 'case', 'same', 'came'}
+        >>> w1 = WordLadderPuzzle("same", "cost", ws)
+        >>> [move for move, _ in w1.iter_moves()]
+        [(0, 'c')]
+        """
+        from_word, chars, words = self._from_word, self._chars, self._words
+        for i in range(len(from_word)):
+            # a word can only share a pattern from another position if it
+            # has "_" at i, which the check on word[i] rules out
+            for word in words.bucket(from_word[:i] + "_" + from_word[i + 1:]):
+                if (word != from_word and word[i] in chars and
+                        (i, word[i]) != skip):
+                    yield (i, word[i]), self._child(word)
+
+    def apply(self, move):
+        """
+        Return the extension of WordLadderPuzzle self made by move, as
+        described in iter_moves.
+
+        @type self: WordLadderPuzzle
+        @type move: (int, str)
+        @rtype: WordLadderPuzzle
+
+        >>> ws = {'cost', 'cast', 'case', 'same', 'came'}
+        >>> print(WordLadderPuzzle("same", "cost", ws).apply((0, 'c')))
+        came -> cost
+        """
+        i, char = move
+        new = self._from_word[:i] + char + self._from_word[i + 1:]
+        assert new != self._from_word and new in self._words
+        return self._child(new)
+
+    def _child(self, from_word):
+        """
+        Return the WordLadderPuzzle stepping from from_word to _to_word
+        through the dictionary of WordLadderPuzzle self.
+
+        @type self: WordLadderPuzzle
+        @type from_word: str
+        @rtype: WordLadderPuzzle
+        """
+        return WordLadderPuzzle(from_word, self._to_word, self._words)
+
+    def inverse(self, move):
+        """
+        Return the move undoing move: changing the letter back.
+
+        @type self: WordLadderPuzzle
+        @type move: (int, str)
+        @rtype: (int, str)
+
+        >>> WordLadderPuzzle("same", "cost", {"came"}).inverse((0, "c"))
+        (0, 's')
+        """
+        return move[0], self._from_word[move[0]]
 
         # TODO
         # override is_solved
@@ -110,26 +251,50 @@ class WordLadderPuzzle(Puzzle):
         """ 
         return self._from_word == self._to_word
 
+    def fail_fast(self):
+        """
+        Return whether WordLadderPuzzle self can never be solved because
+        _to_word is not a word in the set of the same length as _from_word.
+
+        @type self: WordLadderPuzzle
+        @rtype: bool
+
+        >>> ws = {'cost', 'same', 'dig'}
+        >>> WordLadderPuzzle("same", "cost", ws).fail_fast()
+        False
+        >>> WordLadderPuzzle("same", "cast", ws).fail_fast()
+        True
+        >>> WordLadderPuzzle("same", "dig", ws).fail_fast()
+        True
+        """
+        return (not self.is_solved() and
+                (self._to_word not in self._words or
+                 len(self._to_word) != len(self._from_word)))
+
+    def heuristic(self):
+        """
+        Return the number of positions where _from_word differs from
+        _to_word, since each step changes at most one letter.
+
+        @type self: WordLadderPuzzle
+        @rtype: int
+
+        >>> ws = {'cost', 'same'}
+        >>> WordLadderPuzzle("same", "cost", ws).heuristic()
+        4
+        >>> WordLadderPuzzle("cost", "cost", ws).heuristic()
+        0
+        """
+        from_word, to_word = self._from_word, self._to_word
+        mismatches = abs(len(from_word) - len(to_word))
+        for i in range(min(len(from_word), len(to_word))):
+            if from_word[i] != to_word[i]:
+                mismatches += 1
+        return mismatches
+
 
 if __name__ == '__main__':
     import doctest
     doctest.testmod()
-    from puzzle_tools import breadth_first_solve, depth_first_solve
-    from time import time
-    with open("words", "r") as words:
-        word_set = set(words.read().split())
-    w = WordLadderPuzzle("same", "cost", word_set)
-    start = time()
-
-    sol = depth_first_solve(w)
-    end = time()
-    print("Solving word ladder from same->cost")
-    print("...using depth-first-search")
-    print("Solutions: {} took {} seconds.".format(sol, end - start))
-
-    sol = breadth_first_solve(w)
-    end = time()
-    print("Solving word ladder from same->cost")
-    print("...using breadth-first-search")
-    print("Solutions: {} took {} seconds.".format(sol, end - start))
-    start = time()
\ No newline at end of file
+    from puzzle_benchmark import main
+    main(["ladder-same-cost", "--repeat", "1", "--warmup", "0", "--show"])